@@ -1,16 +1,45 @@
+import sys
+# Профилировщик запуска подключается первым, чтобы замерить импорт всех остальных модулей
+from src import startup_profile
+if startup_profile.requested(sys.argv):
+    startup_profile.enable()
+
+import argparse
+import importlib
 import logging
+import multiprocessing
+import os
 import time
-import sys
 import threading
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Telegram-бот новостной аналитики.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Запустить бота и N процессов-воркеров анализа, связанных очередью")
+    parser.add_argument("--worker", action="store_true",
+                        help="Запустить только воркер анализа (в т.ч. на другом хосте с общей очередью)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Вывести профиль запуска при получении первого обновления")
+    return parser.parse_known_args(argv)[0]
+
+
+ARGS = parse_args()
+# Режим очереди должен быть известен до импорта src.config
+if ARGS.workers is not None:
+    os.environ["ANALYSIS_WORKERS"] = str(ARGS.workers)
+
 from src.bot.handlers import bot
 from src.engine.scheduler import start_scheduler
+from src.config import (PRELOAD_ANALYSIS_STACK, PRELOAD_ANALYSIS_DELAY, QUEUE_MODE, ANALYSIS_WORKERS,
+                        LOG_LEVEL, LOG_FORMAT)
+from src.logging_setup import setup_logging
+
+startup_profile.mark("imports_done")
 
 # --- Настройка логгирования ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout,
-)
+# Записи уходят в очередь, в stdout их пишет отдельный поток
+setup_logging(LOG_LEVEL, LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 
@@ -24,9 +53,27 @@ def run_bot_polling_old():
         logger.critical(f"Polling остановлен с критической ошибкой: {e}", exc_info=True)
 
 
+def preload_analysis_stack():
+    """
+    Загружает стек анализа (google.genai, bs4, gnews, telegraph) в фоне,
+    когда бот уже принимает обновления, чтобы первый анализ не ждал импорта.
+    """
+    time.sleep(PRELOAD_ANALYSIS_DELAY)
+    started = time.perf_counter()
+    try:
+        importlib.import_module("src.engine.analyzer")
+        logger.info(f"Стек анализа загружен в фоне за {time.perf_counter() - started:.2f} с.")
+        startup_profile.mark("analysis_stack_loaded")
+    except Exception as e:
+        logger.error(f"Не удалось заранее загрузить стек анализа: {e}", exc_info=True)
+
+
 def run_bot_polling():
     """Запускает бота в режиме polling с автоматическим перезапуском."""
     logger.info("Запуск Telegram-бота в режиме вечного опроса...")
+    if startup_profile.is_enabled():
+        bot.set_update_listener(startup_profile.on_first_update)
+    startup_profile.mark("polling_started")
     while True:
         try:
             # non_stop=False, так как мы сами управляем перезапуском
@@ -38,7 +85,26 @@ def run_bot_polling():
             logger.info("Перезапуск через 15 секунд...")
             time.sleep(15)
 
+def start_local_workers(count: int) -> list:
+    """Запускает процессы-воркеры анализа на этом хосте."""
+    from src.engine.worker import run_worker
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        process = context.Process(target=run_worker, args=(f"local-{index + 1}",),
+                                  name=f"analysis-worker-{index + 1}", daemon=True)
+        process.start()
+        processes.append(process)
+    logger.info(f"Запущено воркеров анализа: {count}.")
+    return processes
+
+
 if __name__ == '__main__':
+    if ARGS.worker:
+        from src.engine.worker import run_worker
+        run_worker()
+        sys.exit(0)
+
     logger.info("Запуск приложения...")
 
     # Запускаем планировщик в отдельном потоке, чтобы он не блокировал бота
@@ -46,5 +112,17 @@ if __name__ == '__main__':
     scheduler_thread.daemon = True  # Поток завершится, когда завершится основная программа
     scheduler_thread.start()
 
+    # Рассылки подписчикам, прерванные остановкой процесса, продолжаются с контрольной точки
+    from src.bot.broadcaster import resume_unfinished_broadcasts
+    threading.Thread(target=resume_unfinished_broadcasts, name="broadcast-resume", daemon=True).start()
+
+    if QUEUE_MODE:
+        # Анализ выполняют воркеры, бот только ставит задачи и доставляет результаты
+        from src.bot.delivery import run_delivery_loop
+        start_local_workers(int(ANALYSIS_WORKERS or 0))
+        threading.Thread(target=run_delivery_loop, name="delivery", daemon=True).start()
+    elif PRELOAD_ANALYSIS_STACK:
+        threading.Thread(target=preload_analysis_stack, name="analysis-preload", daemon=True).start()
+
     # Запускаем бота в основном потоке
     run_bot_polling()
\ No newline at end of file
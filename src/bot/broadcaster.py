@@ -0,0 +1,173 @@
+"""
+Рассылка готовых отчетов подписчикам (/subscribe).
+
+Получатели рассылки делятся на шарды, которые отправляют сообщения параллельно; общий
+ограничитель держит суммарную скорость в пределах BROADCAST_RATE сообщений в секунду,
+а ответ 429 приостанавливает все шарды на retry_after. Статусы доставки сохраняются
+в реестре пачками, поэтому после сбоя рассылка продолжается с неотправленных
+(сообщения последней несохраненной пачки могут уйти повторно).
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from telebot.apihelper import ApiTelegramException
+from src.config import BROADCAST_RATE, BROADCAST_SHARDS
+from src.engine.subscriptions import SubscriptionRegistry, get_subscription_registry
+
+logger = logging.getLogger(__name__)
+
+# Статусы доставки сохраняются каждые столько сообщений шарда
+CHECKPOINT_EVERY = 20
+MAX_SEND_ATTEMPTS = 3
+
+
+class SendRateLimiter:
+    """Равномерный общий лимит отправки: не чаще rate сообщений в секунду, с глобальной паузой после 429."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class Broadcaster:
+    def __init__(self, bot, registry: SubscriptionRegistry, rate: float = 25.0, shards: int = 8):
+        self.bot = bot
+        self.registry = registry
+        self.limiter = SendRateLimiter(rate)
+        self.shards = max(1, shards)
+        self._active: set[int] = set()
+        self._active_lock = threading.Lock()
+
+    def _send_one(self, chat_id: int, text: str) -> str:
+        """Отправляет сообщение одному получателю; возвращает статус доставки."""
+        for _ in range(MAX_SEND_ATTEMPTS):
+            self.limiter.acquire()
+            try:
+                self.bot.send_message(chat_id, text, parse_mode="HTML", disable_web_page_preview=False)
+                return "sent"
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    retry_after = (e.result_json.get("parameters") or {}).get("retry_after", 5)
+                    logger.warning(f"Превышен лимит отправки Telegram, пауза рассылки {retry_after} с.")
+                    self.limiter.pause(retry_after)
+                    continue
+                if e.error_code == 403 or "chat not found" in e.description:
+                    # Бот заблокирован или удален из чата: подписки чата больше не нужны
+                    self.registry.unsubscribe_chat(chat_id)
+                    return "blocked"
+                logger.warning(f"Не удалось отправить отчет в чат {chat_id}: {e.description}")
+                return "failed"
+            except Exception as e:
+                logger.warning(f"Не удалось отправить отчет в чат {chat_id}: {e}")
+                return "failed"
+        return "failed"
+
+    def _send_shard(self, broadcast_id: int, text: str, chat_ids: list[int]) -> Counter:
+        counts = Counter()
+        results = []
+        for chat_id in chat_ids:
+            status = self._send_one(chat_id, text)
+            counts[status] += 1
+            results.append((chat_id, status))
+            if len(results) >= CHECKPOINT_EVERY:
+                self.registry.record_deliveries(broadcast_id, results)
+                results = []
+        self.registry.record_deliveries(broadcast_id, results)
+        return counts
+
+    def run(self, broadcast_id: int) -> dict | None:
+        """
+        Отправляет рассылку всем получателям, оставшимся в 'pending'.
+        Возвращает статистику прогона или None, если рассылка уже выполняется в этом процессе.
+        """
+        with self._active_lock:
+            if broadcast_id in self._active:
+                return None
+            self._active.add(broadcast_id)
+        try:
+            broadcast = self.registry.get_broadcast(broadcast_id)
+            recipients = self.registry.pending_recipients(broadcast_id)
+            shards = [recipients[index::self.shards] for index in range(self.shards) if recipients[index::self.shards]]
+            started = time.perf_counter()
+            counts = Counter()
+            if shards:
+                with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix=f"broadcast-{broadcast_id}") as pool:
+                    for shard_counts in pool.map(lambda shard: self._send_shard(broadcast_id, broadcast["text"], shard),
+                                                 shards):
+                        counts.update(shard_counts)
+            elapsed = time.perf_counter() - started
+            totals = self.registry.finish_broadcast(broadcast_id)
+            sent_now = sum(counts.values())
+            rate = sent_now / elapsed if elapsed > 0 else 0.0
+            logger.info(f"Рассылка #{broadcast_id} ('{broadcast['analysis_type']}'): {sent_now} сообщений "
+                        f"за {elapsed:.1f} с ({rate:.1f} сообщ./с, шардов: {len(shards)}); "
+                        f"доставлено {counts['sent']}, ошибок {counts['failed']}, заблокировали бота {counts['blocked']}. "
+                        f"Итого по рассылке: {dict(totals)}.")
+            return {"id": broadcast_id, "sent": counts["sent"], "failed": counts["failed"],
+                    "blocked": counts["blocked"], "elapsed_s": elapsed, "per_second": rate, "totals": totals}
+        finally:
+            with self._active_lock:
+                self._active.discard(broadcast_id)
+
+
+_default_broadcaster: Broadcaster | None = None
+_default_lock = threading.Lock()
+
+
+def get_broadcaster() -> Broadcaster:
+    global _default_broadcaster
+    with _default_lock:
+        if _default_broadcaster is None:
+            from src.bot.handlers import bot
+            _default_broadcaster = Broadcaster(bot, get_subscription_registry(),
+                                               rate=BROADCAST_RATE, shards=BROADCAST_SHARDS)
+        return _default_broadcaster
+
+
+def broadcast_report(analysis_type: str, report_key: str, text: str) -> dict | None:
+    """Создает (или находит) рассылку отчета report_key и отправляет ее подписчикам типа анализа."""
+    broadcast_id = get_subscription_registry().start_broadcast(analysis_type, report_key, text)
+    if broadcast_id is None:
+        logger.info(f"У '{analysis_type}' нет подписчиков, рассылка не нужна.")
+        return None
+    return get_broadcaster().run(broadcast_id)
+
+
+def start_report_broadcast(analysis_type: str, report_key: str, text: str) -> threading.Thread:
+    """Запускает рассылку отчета в фоне, чтобы не задерживать планировщик и цикл доставки."""
+
+    def target():
+        try:
+            broadcast_report(analysis_type, report_key, text)
+        except Exception as e:
+            logger.error(f"Ошибка рассылки отчета '{analysis_type}': {e}", exc_info=True)
+
+    thread = threading.Thread(target=target, name=f"broadcast-{analysis_type}", daemon=True)
+    thread.start()
+    return thread
+
+
+def resume_unfinished_broadcasts():
+    """Продолжает рассылки, прерванные остановкой или сбоем процесса."""
+    registry = get_subscription_registry()
+    for broadcast_id in registry.unfinished_broadcasts():
+        logger.info(f"Продолжаю прерванную рассылку #{broadcast_id}.")
+        try:
+            get_broadcaster().run(broadcast_id)
+        except Exception as e:
+            logger.error(f"Ошибка при продолжении рассылки #{broadcast_id}: {e}", exc_info=True)
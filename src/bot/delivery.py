@@ -0,0 +1,58 @@
+import logging
+import time
+from src.bot.handlers import bot, send_report, format_report_message
+from src.config import CHAT_ID, TOPIC_CONFIGS, DELIVERY_POLL_INTERVAL
+from src.engine.job_queue import JobQueue, get_job_queue
+from src.bot.broadcaster import start_report_broadcast
+
+logger = logging.getLogger(__name__)
+
+
+def _reply(job: dict, text: str):
+    """Отвечает администратору на исходную команду /run_analysis, если задача была ручной."""
+    reply = job.get("reply")
+    if not reply:
+        return
+    try:
+        bot.send_message(reply["chat_id"], text, reply_to_message_id=reply["message_id"], parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Не удалось ответить на команду по задаче #{job['id']}: {e}")
+
+
+def deliver_job(job: dict):
+    """Отправляет результат завершенной задачи: отчет в топик или ошибку администратору."""
+    analysis_type = job["analysis_type"]
+    result = job.get("result") or ""
+    if job["status"] != "done":
+        logger.error(f"Анализ '{analysis_type}' (задача #{job['id']}) завершился с ошибкой: {result}")
+        _reply(job, f"❌ Произошла ошибка во время анализа '{analysis_type}':\n{result}")
+        return
+
+    topic_id = TOPIC_CONFIGS.get(analysis_type, {}).get("id")
+    _reply(job, f"✅ Анализ '{analysis_type}' завершен, отправляю отчет в целевой топик.")
+    report_message = format_report_message(analysis_type, result)
+    send_report([report_message], CHAT_ID, topic_id)
+    logger.info(f"✅ Отчет '{analysis_type}' (задача #{job['id']}) доставлен.")
+    if job["origin"] == "scheduled":
+        # Рассылка подписчикам привязана к ссылке на отчет: повторная доставка задачи ее не дублирует
+        start_report_broadcast(analysis_type, result, report_message)
+
+
+def run_delivery_loop(queue: JobQueue | None = None):
+    """
+    Цикл доставки в процессе бота: забирает результаты, записанные воркерами, и отправляет их.
+    Доставка "как минимум один раз": задача отмечается доставленной после отправки.
+    """
+    queue = queue or get_job_queue()
+    logger.info("Цикл доставки результатов воркеров запущен.")
+    while True:
+        try:
+            for job in queue.fetch_finished():
+                try:
+                    deliver_job(job)
+                except Exception as e:
+                    logger.error(f"Ошибка доставки задачи #{job['id']}: {e}", exc_info=True)
+                queue.mark_delivered(job["id"])
+        except Exception as e:
+            logger.error(f"Ошибка в цикле доставки: {e}", exc_info=True)
+        time.sleep(DELIVERY_POLL_INTERVAL)
@@ -1,8 +1,8 @@
 import telebot
 from telebot.apihelper import ApiTelegramException
-from src.config import BOT_TOKEN, CHAT_ID, TOPIC_CONFIGS, ADMIN_ID
-from src.engine.analyzer import run_full_analysis
+from src.config import BOT_TOKEN, CHAT_ID, TOPIC_CONFIGS, ADMIN_ID, QUEUE_MODE
 from datetime import datetime
+import io
 import threading
 import logging
 
@@ -16,6 +16,33 @@ MODERATED_TOPIC_IDS = [
 bot = telebot.TeleBot(BOT_TOKEN)
 
 
+def run_full_analysis(analysis_config: dict, analysis_type: str, **kwargs) -> str:
+    """
+    Ленивая обертка над src.engine.analyzer.run_full_analysis: стек анализа
+    (google.genai, bs4, gnews, telegraph) загружается при первом запуске анализа,
+    а не при старте бота.
+    """
+    from src.engine.analyzer import run_full_analysis as _run_full_analysis
+    return _run_full_analysis(analysis_config, analysis_type, **kwargs)
+
+
+def format_report_message(analysis_type: str, telegraph_url: str) -> str:
+    """Формирует сообщение со ссылкой на отчет и дисклеймером."""
+    current_time = datetime.now().strftime('%d.%m.%Y %H:%M')
+    disclaimer = (
+        f"\n\n—\n"
+        f"<i><b>⚠️ Дисклеймер:</b> Данный анализ сгенерирован автоматически и не является "
+        f"инвестиционной рекомендацией. Инвестиции сопряжены с риском. "
+        f"Принимайте решения обдуманно.</i>\n\n"
+        f"<code>Отчет сформирован: {current_time}</code>"
+    )
+    return (
+        f"<b>Анализ по теме: {analysis_type}</b>\n\n"
+        f"<a href='{telegraph_url}'><b>➡️ Читать полный анализ</b></a>"
+        f"{disclaimer}"
+    )
+
+
 def send_report(reports: list[str], chat_id: str, topic_id: str):
     """
     Отправляет серию отчетов в указанный чат и топик.
@@ -109,7 +136,21 @@ def analysis_handler(message):
         bot.reply_to(message, "Ошибка: SUPERGROUP_ID или ID топика не настроены в .env файле.")
         return
 
-    bot.reply_to(message, f"⏳ Начинаю анализ '{analysis_type}'... Это может занять несколько минут.")
+    if QUEUE_MODE:
+        # Анализ выполнит воркер; результат доставит цикл доставки (src/bot/delivery.py)
+        from src.engine.job_queue import get_job_queue, PRIORITY_MANUAL
+        job_queue = get_job_queue()
+        job_id = job_queue.enqueue(analysis_type, origin="manual", priority=PRIORITY_MANUAL,
+                                   reply={"chat_id": message.chat.id, "message_id": message.message_id})
+        bot.reply_to(message, f"⏳ Анализ '{analysis_type}' поставлен в очередь (задача #{job_id}, "
+                              f"задач в очереди: {job_queue.pending_count()}).")
+        return
+
+    # Оценка ожидания допуска к Gemini: два запроса анализа после уже ожидающих запросов
+    from src.services.admission import get_admission_controller, PRIORITY_MANUAL
+    wait = get_admission_controller().estimate_wait(requests=2, priority=PRIORITY_MANUAL)
+    queue_note = f"\nЛимит запросов к Gemini загружен: ожидание очереди ~{wait:.0f} с." if wait >= 5 else ""
+    bot.reply_to(message, f"⏳ Начинаю анализ '{analysis_type}'... Это может занять несколько минут.{queue_note}")
     logger.info(f"Ручной запуск анализа '{analysis_type}' по команде /run_analysis")
 
     # Запускаем тяжелую задачу в отдельном потоке, чтобы не блокировать бота
@@ -121,8 +162,17 @@ def analysis_handler(message):
 def _run_analysis_in_thread(message, analysis_config, analysis_type, topic_id):
     """Эта функция выполняется в отдельном потоке для анализа."""
     try:
+        sent_urls = []
+
+        def send_first_report(url: str):
+            # PROGRESSIVE_PUBLISHING: ссылка уходит сразу после 1-го этапа, страница дополнится позже
+            bot.reply_to(message, f"✅ Фундаментальный анализ '{analysis_type}' готов, отправляю отчет в целевой "
+                                  "топик. Технический раздел появится на той же странице.")
+            send_report([format_report_message(analysis_type, url)], CHAT_ID, topic_id)
+            sent_urls.append(url)
+
         # 1. Получаем URL статьи от анализатора
-        telegraph_url = run_full_analysis(analysis_config, analysis_type)
+        telegraph_url = run_full_analysis(analysis_config, analysis_type, on_first_report=send_first_report)
 
         # Проверяем, не вернул ли анализатор сообщение об ошибке вместо URL
         if not telegraph_url.startswith("http"):
@@ -131,20 +181,12 @@ def _run_analysis_in_thread(message, analysis_config, analysis_type, topic_id):
             bot.reply_to(message, error_message, parse_mode="HTML")
             return
 
+        if telegraph_url in sent_urls:
+            bot.reply_to(message, f"✅ Анализ '{analysis_type}' завершен, страница отчета обновлена.")
+            return
+
         # 2. Формируем новое сообщение с дисклеймером
-        current_time = datetime.now().strftime('%d.%m.%Y %H:%M')
-        disclaimer = (
-            f"\n\n—\n"
-            f"<i><b>⚠️ Дисклеймер:</b> Данный анализ сгенерирован автоматически и не является "
-            f"инвестиционной рекомендацией. Инвестиции сопряжены с риском. "
-            f"Принимайте решения обдуманно.</i>\n\n"
-            f"<code>Отчет сформирован: {current_time}</code>"
-        )
-        report_message = (
-            f"<b>Анализ по теме: {analysis_type}</b>\n\n"
-            f"<a href='{telegraph_url}'><b>➡️ Читать полный анализ</b></a>"
-            f"{disclaimer}"
-        )
+        report_message = format_report_message(analysis_type, telegraph_url)
 
         bot.reply_to(message, f"✅ Анализ '{analysis_type}' завершен, отправляю отчет в целевой топик.")
         send_report([report_message], CHAT_ID, topic_id)
@@ -154,6 +196,132 @@ def _run_analysis_in_thread(message, analysis_config, analysis_type, topic_id):
         bot.reply_to(message, f"❌ Критическая ошибка в потоке анализа '{analysis_type}': {e}")
 
 
+@bot.message_handler(commands=['profile'])
+def profile_handler(message):
+    """
+    Выполняет один анализ под профилировщиком и присылает отчет администратору:
+    /profile <ТИП_АНАЛИЗА>. Результат анализа публикуется в Telegraph, но в топик не отправляется,
+    в архив не сохраняется и не влияет на инкрементальный анализ.
+    """
+    if message.from_user.id != int(ADMIN_ID):
+        logger.warning(f"Попытка несанкционированного доступа к /profile от user_id: {message.from_user.id}")
+        return
+    args = message.text.split()
+    if len(args) < 2 or args[1].upper() not in TOPIC_CONFIGS:
+        bot.reply_to(message, "Пожалуйста, укажите тип анализа.\n"
+                              f"Доступные типы: {', '.join(TOPIC_CONFIGS.keys())}\n"
+                              "Пример: /profile USA_STOCKS")
+        return
+    analysis_type = args[1].upper()
+    bot.reply_to(message, f"⏳ Запускаю анализ '{analysis_type}' под профилировщиком (в процессе бота)...")
+    logger.info(f"Профилирование анализа '{analysis_type}' по команде /profile")
+    threading.Thread(target=_run_profile_in_thread, args=(message, analysis_type), name="profile").start()
+
+
+def _run_profile_in_thread(message, analysis_type):
+    """Выполняет профилирование и отправляет отчет и collapsed stacks документами."""
+    # Профилировщик загружается только по команде: обычные запуски его не затрагивают
+    from src.engine.run_profiler import profile_call, ProfileBusy
+    try:
+        profile = profile_call(lambda: run_full_analysis(TOPIC_CONFIGS[analysis_type], analysis_type, persist=False))
+    except ProfileBusy as e:
+        bot.reply_to(message, f"❌ {e}")
+        return
+    except Exception as e:
+        logger.error(f"Ошибка при профилировании анализа '{analysis_type}': {e}", exc_info=True)
+        bot.reply_to(message, f"❌ Ошибка при профилировании анализа '{analysis_type}': {e}")
+        return
+
+    result = profile["result"] or ""
+    outcome = f"<a href='{result}'>отчет</a>" if result.startswith("http") else "анализ завершился с ошибкой"
+    bot.reply_to(message, f"✅ Профиль '{analysis_type}': {profile['wall_s']:.1f} с, "
+                          f"пик памяти {profile['peak_kib'] / 1024:.1f} МиБ, {outcome}.",
+                 parse_mode="HTML", disable_web_page_preview=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M')
+    for name, content in ((f"profile_{analysis_type}_{stamp}.txt", profile["report"]),
+                          (f"profile_{analysis_type}_{stamp}.collapsed", profile["collapsed"])):
+        document = telebot.types.InputFile(io.BytesIO(content.encode("utf-8")), file_name=name)
+        bot.send_document(message.chat.id, document, reply_to_message_id=message.message_id)
+
+
+@bot.message_handler(commands=['history'])
+def history_handler(message):
+    """Показывает последние отчеты из архива: /history <ТИП_АНАЛИЗА> [количество]."""
+    if message.from_user.id != int(ADMIN_ID):
+        logger.warning(f"Попытка несанкционированного доступа к /history от user_id: {message.from_user.id}")
+        return
+    args = message.text.split()
+    if len(args) < 2 or args[1].upper() not in TOPIC_CONFIGS:
+        bot.reply_to(message, "Пожалуйста, укажите тип анализа.\n"
+                              f"Доступные типы: {', '.join(TOPIC_CONFIGS.keys())}\n"
+                              "Пример: /history CRYPTO 5")
+        return
+    analysis_type = args[1].upper()
+    limit = int(args[2]) if len(args) > 2 and args[2].isdigit() else 5
+
+    from src.engine.archive import get_report_archive
+    entries = get_report_archive().latest(analysis_type, limit=min(limit, 50))
+    if not entries:
+        bot.reply_to(message, f"В архиве пока нет отчетов '{analysis_type}'.")
+        return
+
+    lines = [f"<b>Последние отчеты: {analysis_type}</b>"]
+    for entry in entries:
+        created_at = datetime.fromtimestamp(entry["created_at"]).strftime('%d.%m.%Y %H:%M')
+        link = f"<a href='{entry['url']}'>отчет</a>" if entry["url"] else "<i>не опубликован</i>"
+        lines.append(f"• {created_at} — {link}")
+    bot.reply_to(message, "\n".join(lines), parse_mode="HTML", disable_web_page_preview=True)
+
+
+def _is_chat_admin(chat_id: int, user_id: int) -> bool:
+    try:
+        return bot.get_chat_member(chat_id, user_id).status in ("administrator", "creator")
+    except Exception as e:
+        logger.warning(f"Не удалось проверить права пользователя {user_id} в чате {chat_id}: {e}")
+        return False
+
+
+@bot.message_handler(commands=['subscribe', 'unsubscribe'])
+def subscription_handler(message):
+    """
+    Подписка чата на отчеты: /subscribe <ТИП_АНАЛИЗА>, отписка: /unsubscribe <ТИП_АНАЛИЗА>.
+    Без аргумента показывает текущие подписки чата. В группах подписками управляют только
+    администраторы группы; основной чат получает отчеты в топики и подписаться не может.
+    """
+    if str(message.chat.id) == CHAT_ID:
+        if str(message.message_thread_id) in MODERATED_TOPIC_IDS:
+            # Команды в защищенных топиках удаляются, как и остальные сообщения
+            moderate_topic(message)
+        else:
+            bot.reply_to(message, "Отчеты и так публикуются в топиках этой группы, подписка не нужна.")
+        return
+    if message.chat.type in ("group", "supergroup") and not _is_chat_admin(message.chat.id, message.from_user.id):
+        bot.reply_to(message, "Подписками группы управляют только ее администраторы.")
+        return
+    from src.engine.subscriptions import get_subscription_registry
+    registry = get_subscription_registry()
+    command = message.text.split()[0].lstrip('/').split('@')[0]
+    args = message.text.split()
+    if len(args) < 2 or args[1].upper() not in TOPIC_CONFIGS:
+        current = registry.subscriptions(message.chat.id)
+        bot.reply_to(message, f"Текущие подписки: {', '.join(current) if current else 'нет'}.\n"
+                              f"Доступные типы: {', '.join(TOPIC_CONFIGS.keys())}\n"
+                              f"Пример: /{command} CRYPTO")
+        return
+    analysis_type = args[1].upper()
+    if command == 'subscribe':
+        changed = registry.subscribe(analysis_type, message.chat.id)
+        text = (f"✅ Подписка на отчеты '{analysis_type}' оформлена." if changed
+                else f"Подписка на отчеты '{analysis_type}' уже есть.")
+    else:
+        changed = registry.unsubscribe(analysis_type, message.chat.id)
+        text = (f"Подписка на отчеты '{analysis_type}' отменена." if changed
+                else f"Подписки на отчеты '{analysis_type}' не было.")
+    if changed:
+        logger.info(f"Чат {message.chat.id}: /{command} {analysis_type}")
+    bot.reply_to(message, text)
+
+
 @bot.message_handler(content_types=['text', 'photo', 'video', 'document', 'sticker'])
 def moderate_topic(message):
     """Удаляет все сообщения в защищенных топиках, кроме сообщений от самого бота."""
@@ -164,6 +332,7 @@ def moderate_topic(message):
     if is_correct_chat and is_correct_topic and not is_from_bot:
         try:
             bot.delete_message(message.chat.id, message.message_id)
-            logger.info(f"Удалено сообщение от пользователя {message.from_user.username} в модерируемом топике.")
+            logger.info("Удалено сообщение от пользователя %s в модерируемом топике.", message.from_user.username,
+                        extra={"sample_every": 20})
         except Exception as e:
             logger.error(f"Не удалось удалить сообщение: {e}")
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from src.prompts import *
+from src.prompts import USA_STOCKS_PROMPT, CRYPTO_PROMPT, CURRENCY_PROMPT
 
 # Загружаем переменные из .env файла
 load_dotenv()
@@ -14,6 +14,10 @@ OUTPUT_DIR = DATA_DIR / "output"
 # Убедимся, что директория для вывода существует
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Архив отчетов (сжатые сегменты JSONL + индекс) для /history и последующих запусков
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", OUTPUT_DIR / "archive"))
+
 # --- Ключи API ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
@@ -31,8 +35,128 @@ CURRENCY_ID = os.getenv("CURRENCY_ID")
 CRYPTO_ID = os.getenv("CRYPTO_ID")
 USA_STOCKS_ID = os.getenv("USA_STOCKS_ID")
 
+# --- Настройки Gemini ---
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Хеджирование: если запрос не завершился за порог (перцентиль наблюдаемых задержек),
+# отправляется дублирующий запрос (к GEMINI_FALLBACK_MODEL, если задана) и берется первый ответ
+GEMINI_HEDGING = os.getenv("GEMINI_HEDGING", "false").lower() in ("1", "true", "yes")
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL")
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "90"))
+# Порог по умолчанию (в секундах), пока накоплено меньше GEMINI_HEDGE_MIN_SAMPLES замеров
+GEMINI_HEDGE_DEFAULT_DELAY = float(os.getenv("GEMINI_HEDGE_DEFAULT_DELAY", "90"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "10"))
+# Повторы и предохранитель: общий бюджет повторов (доля от числа запросов) и порог сбоев подряд
+GEMINI_RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", "5"))
+GEMINI_RETRY_BUDGET_RATIO = float(os.getenv("GEMINI_RETRY_BUDGET_RATIO", "0.2"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET_TIMEOUT = float(os.getenv("GEMINI_BREAKER_RESET_TIMEOUT", "120"))
+# Общий для процесса допуск запросов: лимиты запросов и токенов в минуту (0 — без лимита)
+# и максимальное ожидание допуска. Плановые анализы обслуживаются раньше ручных.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "250000"))
+GEMINI_ADMISSION_MAX_WAIT = float(os.getenv("GEMINI_ADMISSION_MAX_WAIT", "900"))
+# Режим передачи статической инструкции промпта:
+# "explicit" — кэш Gemini (cached content), "system" — system_instruction, "off" — весь промпт в запросе
+GEMINI_PROMPT_CACHE = os.getenv("GEMINI_PROMPT_CACHE", "explicit")
+GEMINI_PROMPT_CACHE_TTL = int(os.getenv("GEMINI_PROMPT_CACHE_TTL", "3600"))
+# Формат ответов модели: "html" — HTML по шаблону промпта (разбор регулярными выражениями),
+# "json" — JSON по схемам src/services/analysis_schema.py, HTML для Telegraph собирается локально
+GEMINI_OUTPUT_MODE = os.getenv("GEMINI_OUTPUT_MODE", "html").lower()
+
+# --- Запуск ---
+# Подгружать стек анализа в фоне после старта опроса бота, чтобы первый анализ не ждал импорта
+PRELOAD_ANALYSIS_STACK = os.getenv("PRELOAD_ANALYSIS_STACK", "true").lower() in ("1", "true", "yes")
+PRELOAD_ANALYSIS_DELAY = float(os.getenv("PRELOAD_ANALYSIS_DELAY", "5"))
+# Страница с 1-м этапом публикуется и ссылка отправляется сразу, технический раздел
+# дописывается на ту же страницу после 2-го этапа (в режиме воркеров не используется)
+PROGRESSIVE_PUBLISHING = os.getenv("PROGRESSIVE_PUBLISHING", "false").lower() in ("1", "true", "yes")
+
+# --- Логгирование ---
+# "json" — одна запись JSON на строку (с полями analysis_type и run_id), "text" — прежний текстовый формат
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# --- Воркеры анализа ---
+# Если задано (в т.ч. флагом run.py --workers N), бот ставит анализы в очередь,
+# а выполняют их отдельные процессы-воркеры (python run.py --worker, в т.ч. на других хостах)
+ANALYSIS_WORKERS = os.getenv("ANALYSIS_WORKERS")
+QUEUE_MODE = ANALYSIS_WORKERS is not None
+JOB_QUEUE_PATH = Path(os.getenv("JOB_QUEUE_PATH", DATA_DIR / "queue" / "jobs.sqlite3"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "900"))
+DELIVERY_POLL_INTERVAL = float(os.getenv("DELIVERY_POLL_INTERVAL", "2"))
+
+# --- Рассылка подписчикам ---
+# Подписки (/subscribe) и контрольные точки рассылок отчетов
+SUBSCRIPTIONS_PATH = Path(os.getenv("SUBSCRIPTIONS_PATH", DATA_DIR / "subscriptions" / "subscribers.sqlite3"))
+# Общий лимит отправки сообщений в секунду (Telegram допускает около 30 на бота)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+# Число параллельных потоков рассылки (получатели делятся между ними)
+BROADCAST_SHARDS = int(os.getenv("BROADCAST_SHARDS", "8"))
+
 # --- Опции парсинга новостей ---
-NEWS_SOURCE = "google"  # Варианты: "google", "newsapi"
+NEWS_SOURCE = "google"  # Варианты: "google", "newsapi", "rss"
+# Окно выдачи новостей (формат GNews: "12h", "1d", "7d")
+NEWS_PERIOD = os.getenv("NEWS_PERIOD", "12h")
+# Темы, которых нет среди тем и разделов Google News (GEOPOLITICS, FOREX и т.п.), по умолчанию
+# не дают новостей; при включенной опции по ним выполняется поиск за NEWS_PERIOD
+GNEWS_SEARCH_FALLBACK = os.getenv("GNEWS_SEARCH_FALLBACK", "false").lower() in ("1", "true", "yes")
+# Срок (в секундах от начала сбора) для каждого источника: после него сбор не ждет источник
+NEWS_SOURCE_DEADLINES = {
+    "google": float(os.getenv("GNEWS_DEADLINE", "90")),
+    "newsapi": float(os.getenv("NEWSAPI_DEADLINE", "30")),
+    "rss": float(os.getenv("RSS_DEADLINE", "30")),
+}
+# Сколько самых свежих статей попадает в дайджест (0 — все собранные)
+MAX_DIGEST_ARTICLES = int(os.getenv("MAX_DIGEST_ARTICLES", "0"))
+
+# --- Полные тексты статей ---
+# Для FULLTEXT_TOP_N самых свежих статей дайджеста загружается полный текст вместо описания
+# (неразрешенные ссылки-перенаправления Google News пропускаются: текста статьи по ним нет)
+FULLTEXT_MODE = os.getenv("FULLTEXT_MODE", "false").lower() in ("1", "true", "yes")
+FULLTEXT_TOP_N = int(os.getenv("FULLTEXT_TOP_N", "15"))
+FULLTEXT_MAX_CHARS = int(os.getenv("FULLTEXT_MAX_CHARS", "3000"))
+FULLTEXT_MAX_WORKERS = int(os.getenv("FULLTEXT_MAX_WORKERS", "8"))
+FULLTEXT_PER_HOST = int(os.getenv("FULLTEXT_PER_HOST", "2"))
+FULLTEXT_TIMEOUT = float(os.getenv("FULLTEXT_TIMEOUT", "10"))
+FULLTEXT_CACHE_TTL = float(os.getenv("FULLTEXT_CACHE_TTL", str(7 * 24 * 3600)))
+# --- Сюжеты ---
+# Похожие статьи (TF-IDF и косинусное сходство) объединяются в сюжеты, и дайджест
+# содержит одну запись на сюжет: заголовок, ключевые факты и число источников
+STORY_CLUSTERING = os.getenv("STORY_CLUSTERING", "false").lower() in ("1", "true", "yes")
+STORY_SIMILARITY = float(os.getenv("STORY_SIMILARITY", "0.35"))
+STORY_MAX_FEATURES = int(os.getenv("STORY_MAX_FEATURES", "2000"))
+STORY_MAX_FACTS = int(os.getenv("STORY_MAX_FACTS", "3"))
+
+# --- Инкрементальный анализ ---
+# В дайджест попадают только статьи, впервые появившиеся после последнего опубликованного
+# отчета того же типа, а модель получает краткое содержание этого отчета и обновляет его.
+# Требует ARCHIVE_ENABLED.
+INCREMENTAL_MODE = os.getenv("INCREMENTAL_MODE", "false").lower() in ("1", "true", "yes")
+# Если предыдущий отчет старше, выполняется полный анализ
+INCREMENTAL_MAX_AGE_HOURS = float(os.getenv("INCREMENTAL_MAX_AGE_HOURS", "24"))
+INCREMENTAL_SUMMARY_CHARS = int(os.getenv("INCREMENTAL_SUMMARY_CHARS", "1500"))
+CACHE_DIR = DATA_DIR / "cache"
+# Таймаут загрузки RSS-ленты (ETag/Last-Modified лент хранятся в CACHE_DIR/feeds.sqlite3)
+FEED_TIMEOUT = float(os.getenv("FEED_TIMEOUT", "15"))
+
+# --- Технические данные тикеров ---
+# Цена, MA50, MA200 и RSI из ответов 2-го этапа кэшируются (CACHE_DIR/ticker_snapshots.sqlite3)
+# и подставляются в промпт 2-го этапа всех типов анализа, пока не истечет срок (в секундах) для класса актива
+TICKER_SNAPSHOT_CACHE = os.getenv("TICKER_SNAPSHOT_CACHE", "true").lower() in ("1", "true", "yes")
+TICKER_TTL_STOCK = float(os.getenv("TICKER_TTL_STOCK", str(6 * 3600)))
+TICKER_TTL_CRYPTO = float(os.getenv("TICKER_TTL_CRYPTO", "3600"))
+TICKER_TTL_FX = float(os.getenv("TICKER_TTL_FX", str(2 * 3600)))
+
+# --- Общий макроэкономический фон ---
+# Новости по общим макро-темам сводятся моделью в одну сводку, которая живет MACRO_TTL_MINUTES
+# (утренние и вечерние запуски разных типов анализа попадают в одно окно) и подставляется
+# в промпты 1-го этапа вместо самих этих новостей (CACHE_DIR/macro_context.json)
+MACRO_CONTEXT = os.getenv("MACRO_CONTEXT", "false").lower() in ("1", "true", "yes")
+MACRO_TOPICS = [topic.strip() for topic in os.getenv(
+    "MACRO_TOPICS", "ECONOMY,FINANCE,ENERGY,GEOPOLITICS,POLITICS,WORLD").split(",") if topic.strip()]
+MACRO_MAX_ARTICLES = int(os.getenv("MACRO_MAX_ARTICLES", "60"))
+MACRO_TTL_MINUTES = float(os.getenv("MACRO_TTL_MINUTES", "90"))
 
 
 # --- Конфигурация топиков для анализа ---
@@ -40,7 +164,7 @@ TOPIC_CONFIGS = {
     "USA_STOCKS": {
         "id": os.getenv("USA_STOCKS_ID"),
         "prompt": USA_STOCKS_PROMPT,
-        "news_source": "google",
+        "news_sources": ["google"],
         "news_topics": ['WORLD','BUSINESS','TECHNOLOGY',
                         'ECONOMY','FINANCE','ENERGY', 'GEOPOLITICS'],
         "parsing_keys": {
@@ -51,7 +175,7 @@ TOPIC_CONFIGS = {
     "CRYPTO": {
         "id": os.getenv("CRYPTO_ID"),
         "prompt": CRYPTO_PROMPT,
-        "news_source": "google",
+        "news_sources": ["google"],
         "news_topics": ['CRYPTOCURRENCIES', 'BITCOIN', 'ETHEREUM',
                         'REGULATION', 'LAWS', 'ENERGY', 'TECHNOLOGY',
                         'FINANCE', 'COMPANIES'],
@@ -63,7 +187,7 @@ TOPIC_CONFIGS = {
     "CURRENCY": {
         "id": os.getenv("CURRENCY_ID"),
         "prompt": CURRENCY_PROMPT,
-        "news_source": "google",
+        "news_sources": ["google"],
         "news_topics": ['FOREX', 'CURRENCY', 'ECONOMY',
                         'FINANCE', 'POLITICS', 'MARKETS',
                         'COMMODITIES'],
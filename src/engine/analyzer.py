@@ -1,27 +1,87 @@
+import io
 import logging
 import sys
 import re
+import time
+from collections.abc import Callable, Iterable, Iterator
 from datetime import datetime
-from src.services.gemini_client import GeminiClient
-from src.config import OUTPUT_DIR, TOPIC_CONFIGS, SUPERGROUP_LINK
-from src.services.news_collector_goog import gather_strategic_news
+from src.services.gemini_client import GeminiClient, GeminiError
+from src.services.admission import PRIORITY_MANUAL
+from src.logging_setup import log_context
+from src.config import (OUTPUT_DIR, TOPIC_CONFIGS, SUPERGROUP_LINK, MAX_DIGEST_ARTICLES, FULLTEXT_MODE,
+                        FULLTEXT_TOP_N, FULLTEXT_MAX_CHARS, FULLTEXT_MAX_WORKERS, FULLTEXT_PER_HOST,
+                        FULLTEXT_TIMEOUT, FULLTEXT_CACHE_TTL, CACHE_DIR, ARCHIVE_ENABLED, INCREMENTAL_MODE,
+                        INCREMENTAL_MAX_AGE_HOURS, INCREMENTAL_SUMMARY_CHARS, STORY_CLUSTERING,
+                        STORY_SIMILARITY, STORY_MAX_FEATURES, STORY_MAX_FACTS, MACRO_CONTEXT,
+                        PROGRESSIVE_PUBLISHING)
+from src.prompts import INCREMENTAL_UPDATE_PROMPT
+from src.models import Article, Story
+from src.services.news_collector import iter_topic_news, dedupe_articles, rank_articles
 from data.allowed_tags_for_telegraph import ALLOWED_TAGS
 from src.services.telegraph_client import TelegraphClient
 from bs4 import BeautifulSoup
 
 logger = logging.getLogger(__name__)
 
-def _prepare_digest_for_ai(articles: list) -> str:
-    """Готовит новостной дайджест для передачи в AI."""
-    if not articles:
+# Технический раздел страницы, опубликованной до завершения 2-го этапа
+STAGE2_PENDING_HTML = ("<h4>Технический анализ</h4><p><i>Технический анализ выполняется. "
+                       "Страница будет обновлена автоматически.</i></p>")
+STAGE2_FAILED_HTML = ("<h4>Технический анализ</h4><p><i>Технический анализ не был выполнен из-за ошибки "
+                      "или отсутствия данных.</i></p>")
+
+_article_fetcher = None
+
+
+def _get_article_fetcher():
+    """Загрузчик полных текстов, общий для процесса (кэш и лимиты по хостам разделяются)."""
+    global _article_fetcher
+    if _article_fetcher is None:
+        from src.services.article_fetcher import ArticleFetcher, ArticleBodyCache
+        _article_fetcher = ArticleFetcher(
+            cache=ArticleBodyCache(CACHE_DIR / "article_bodies.sqlite3", ttl_seconds=FULLTEXT_CACHE_TTL),
+            max_workers=FULLTEXT_MAX_WORKERS,
+            per_host=FULLTEXT_PER_HOST,
+            timeout=FULLTEXT_TIMEOUT,
+            max_chars=FULLTEXT_MAX_CHARS,
+        )
+    return _article_fetcher
+
+
+def _prepare_digest_for_ai(articles: Iterable[Article]) -> str:
+    """
+    Готовит новостной дайджест для передачи в AI.
+    Статьи читаются по одной, поэтому сюда можно передать генератор сборщика.
+    """
+    digest = io.StringIO()
+    digest.write("Вот дайджест свежих новостей для анализа:\n")
+    count = 0
+    for count, article in enumerate(articles, 1):
+        digest.write(f"\n--- Новость #{count} ---\n")
+        digest.write(f"Источник: {article.publisher}\n")
+        digest.write(f"Заголовок: {article.title}\n")
+        digest.write(f"Краткое содержание:\n{article.text or 'Нет данных.'}")
+    if not count:
         return "Нет новостей для анализа."
-    digest_parts = ["Вот дайджест свежих новостей для анализа:\n"]
-    for i, article in enumerate(articles, 1):
-        digest_parts.append(f"\n--- Новость #{i} ---\n")
-        digest_parts.append(f"Источник: {article.get('source', 'N/A')}\n")
-        digest_parts.append(f"Заголовок: {article.get('title', 'Без заголовка')}\n")
-        digest_parts.append(f"Краткое содержание:\n{article.get('description', 'Нет данных.')}")
-    return "".join(digest_parts)
+    logger.info(f"Дайджест собран: {count} уникальных новостей.")
+    return digest.getvalue()
+
+
+def _prepare_story_digest_for_ai(stories: list[Story]) -> str:
+    """Готовит дайджест, в котором каждый сюжет — одна запись с заголовком, источниками и ключевыми фактами."""
+    if not stories:
+        return "Нет новостей для анализа."
+    digest = io.StringIO()
+    digest.write("Вот дайджест свежих новостей для анализа, сгруппированных по сюжетам:\n")
+    for number, story in enumerate(stories, 1):
+        publishers = story.publishers
+        digest.write(f"\n--- Сюжет #{number} (источников: {len(publishers)}, статей: {len(story.articles)}) ---\n")
+        digest.write(f"Заголовок: {story.headline}\n")
+        digest.write(f"Источники: {', '.join(publishers[:8])}{' и др.' if len(publishers) > 8 else ''}\n")
+        digest.write("Ключевые факты:\n")
+        for fact in story.key_facts(STORY_MAX_FACTS) or ["Нет данных."]:
+            digest.write(f"- {fact}\n")
+    logger.info(f"Дайджест собран: {len(stories)} сюжетов.")
+    return digest.getvalue()
 
 
 def _sanitize_html_for_telegraph_old(html_content: str) -> str:
@@ -119,26 +179,202 @@ def _clean_ai_meta_response(text: str) -> str:
     return cleaned_text.strip()
 
 
-def run_full_analysis(analysis_config: dict, analysis_type: str) -> str:
+def _stage1_page_html(page_title: str, stage1_text: str) -> str:
+    """Заголовок страницы и очищенный HTML 1-го этапа без технической части (запроса на 2-й этап)."""
+    stage1_clean = stage1_text.split("ЗАПРОС НА ВТОРОЙ ЭТАП")[0].strip()
+    return f"<h3>{page_title}</h3>" + _sanitize_html_for_telegraph(stage1_clean)
+
+
+def _collect_urls(articles: Iterable[Article], urls: list[str]) -> Iterator[Article]:
+    """Этап конвейера: запоминает адреса статей, дошедших до дайджеста."""
+    for article in articles:
+        urls.append(article.url)
+        yield article
+
+
+def _mark_digest_seen(analysis_type: str, urls: list[str], seen_at: float):
+    """Отмечает статьи дайджеста опубликованного отчета как учтенные; ошибка не прерывает анализ."""
+    try:
+        from src.engine.seen_articles import get_seen_articles
+        get_seen_articles().record(analysis_type, urls, seen_at=seen_at)
+    except Exception as e:
+        logger.error(f"Не удалось отметить статьи отчета '{analysis_type}' как учтенные: {e}", exc_info=True)
+
+
+def _archive_report(analysis_type: str, **fields):
+    """Сохраняет материалы запуска в архив отчетов; ошибка архива не прерывает анализ."""
+    if not ARCHIVE_ENABLED:
+        return
+    try:
+        from src.engine.archive import get_report_archive
+        get_report_archive().append({"analysis_type": analysis_type, **fields})
+    except Exception as e:
+        logger.error(f"Не удалось сохранить отчет '{analysis_type}' в архив: {e}", exc_info=True)
+
+
+def _previous_report_context(analysis_type: str) -> dict | None:
+    """
+    Краткое содержание последнего опубликованного отчета для инкрементального анализа:
+    время, тезисы без разметки и тикеры. None, если отчета нет или он старше INCREMENTAL_MAX_AGE_HOURS.
+    """
+    if not ARCHIVE_ENABLED:
+        logger.warning("Инкрементальный анализ требует ARCHIVE_ENABLED, выполняется полный анализ.")
+        return None
+    try:
+        from src.engine.archive import get_report_archive
+        archive = get_report_archive()
+        entries = archive.latest(analysis_type, limit=1, only_published=True)
+        if not entries or entries[0]["created_at"] < time.time() - INCREMENTAL_MAX_AGE_HOURS * 3600:
+            return None
+        record = archive.load(entries[0])
+    except Exception as e:
+        logger.error(f"Не удалось прочитать предыдущий отчет '{analysis_type}': {e}", exc_info=True)
+        return None
+
+    # В записях до появления полей theses/tickers тезисы берутся из полного текста 1-го этапа
+    theses = record.get("theses") or record.get("stage1") or ""
+    soup = BeautifulSoup(theses, 'html.parser')
+    for tag in soup.find_all(["br", "p", "li", "h3", "h4"]):
+        tag.insert_after("\n")
+    lines = (" ".join(line.split()) for line in soup.get_text().splitlines())
+    summary = "\n".join(line for line in lines if line)
+    if len(summary) > INCREMENTAL_SUMMARY_CHARS:
+        summary = summary[:INCREMENTAL_SUMMARY_CHARS].rsplit("\n", 1)[0] + "\n..."
+    return {"created_at": entries[0]["created_at"], "summary": summary, "tickers": record.get("tickers") or []}
+
+
+def _incremental_header(previous: dict) -> str:
+    return INCREMENTAL_UPDATE_PROMPT.format(
+        previous_time=datetime.fromtimestamp(previous["created_at"]).strftime("%d.%m.%Y %H:%M"),
+        tickers=", ".join(previous["tickers"]) or "нет данных",
+        summary=previous["summary"],
+    )
+
+
+def run_full_analysis(analysis_config: dict, analysis_type: str,
+                      gemini_client: GeminiClient | None = None,
+                      telegraph_client: TelegraphClient | None = None,
+                      gnews_instance=None, priority: int = PRIORITY_MANUAL,
+                      on_first_report: Callable[[str], None] | None = None, persist: bool = True) -> str:
+    """
+    Точка входа анализа: все записи лога внутри помечаются типом анализа и run_id
+    (см. src/logging_setup.py). Параметры — как у _run_full_analysis.
+    """
+    with log_context(analysis_type=analysis_type):
+        return _run_full_analysis(analysis_config, analysis_type, gemini_client=gemini_client,
+                                  telegraph_client=telegraph_client, gnews_instance=gnews_instance,
+                                  priority=priority, on_first_report=on_first_report, persist=persist)
+
+
+def _run_full_analysis(analysis_config: dict, analysis_type: str,
+                       gemini_client: GeminiClient | None = None,
+                       telegraph_client: TelegraphClient | None = None,
+                       gnews_instance=None, priority: int = PRIORITY_MANUAL,
+                       on_first_report: Callable[[str], None] | None = None, persist: bool = True) -> str:
     """
     Выполняет полный цикл анализа, создает страницу в Telegraph и возвращает
     сообщение со ссылкой для отправки в Telegram.
+    priority: приоритет запросов к Gemini (плановые анализы передают PRIORITY_SCHEDULED).
+    on_first_report: при PROGRESSIVE_PUBLISHING страница с 1-м этапом публикуется до завершения
+    2-го, и функция вызывается с ее URL (например, чтобы сразу отправить ссылку). После 2-го этапа
+    та же страница обновляется; если функция была вызвана, ссылка уже отправлена.
+    persist: сохранять запуск в архив и отмечать статьи дайджеста как учтенные (False — для /profile,
+    чей отчет не отправляется в топик и не должен влиять на следующие инкрементальные анализы).
+
+    gemini_client, telegraph_client, gnews_instance позволяют подставить готовые
+    клиенты (например, локальные заглушки из src/loadtest). По умолчанию
+    создаются настоящие.
     """
+    # Заполняется, когда страница 1-го этапа опубликована и ссылка, возможно, уже отправлена
+    first_report = {}
     try:
+        started = time.perf_counter()
+        started_at = time.time()
         prompt_template = analysis_config.get("prompt")
         parsing_keys = analysis_config.get("parsing_keys", {})
 
         # 1. Сбор новостей и запуск анализа Gemini
         logger.info(f"Сбор новостей для '{analysis_type}'...")
-        news = gather_strategic_news(topics=analysis_config.get("news_topics", []))
-        digest = _prepare_digest_for_ai(news)
-
-        client = GeminiClient()
-        analysis_parts = client.run_two_stage_analysis(
-            digest=digest,
-            prompt_template=prompt_template,
-            parsing_keys=parsing_keys
-        )
+        # Сбор, дедупликация, отбор и дайджест работают потоково, статья за статьей
+        articles = dedupe_articles(iter_topic_news(analysis_config, gnews_instance=gnews_instance))
+        previous = None
+        delta_stats = {}
+        if INCREMENTAL_MODE:
+            from src.engine.seen_articles import get_seen_articles
+            previous = _previous_report_context(analysis_type)
+            # Учтенными статьи отмечаются после публикации (и при полном анализе, чтобы следующий
+            # запуск мог быть инкрементальным), причем только попавшие в дайджест
+            articles = get_seen_articles().filter_new(
+                analysis_type, articles, since=previous["created_at"] if previous else None, stats=delta_stats
+            )
+        client = gemini_client or GeminiClient()
+        macro = None
+        macro_stats = {}
+        if MACRO_CONTEXT:
+            from src.engine.macro_context import get_macro_context, without_macro_articles
+            # Сводка общая для всех типов анализа в окне; ее новости не дублируются в дайджесте
+            macro = get_macro_context(client, gnews_instance=gnews_instance, priority=priority)
+            if macro:
+                articles = without_macro_articles(articles, macro, stats=macro_stats)
+        if MAX_DIGEST_ARTICLES:
+            articles = rank_articles(articles, MAX_DIGEST_ARTICLES)
+        if FULLTEXT_MODE:
+            from src.services.article_fetcher import with_full_text
+            articles = with_full_text(articles, _get_article_fetcher(), FULLTEXT_TOP_N)
+        digest_urls = []
+        if INCREMENTAL_MODE:
+            articles = _collect_urls(articles, digest_urls)
+        if STORY_CLUSTERING:
+            from src.services.story_clustering import cluster_articles
+            stories = cluster_articles(list(articles), threshold=STORY_SIMILARITY, max_features=STORY_MAX_FEATURES)
+            digest = _prepare_story_digest_for_ai(stories)
+        else:
+            digest = _prepare_digest_for_ai(articles)
+        if previous:
+            saved_share = delta_stats["skipped_chars"] / max(delta_stats["skipped_chars"] + len(digest), 1)
+            logger.info(f"Инкрементальный анализ '{analysis_type}': новых статей {delta_stats['new']}, "
+                        f"пропущено уже учтенных {delta_stats['skipped']} "
+                        f"(~{delta_stats['skipped_chars']} символов, {saved_share:.0%} дайджеста).")
+            digest = _incremental_header(previous) + digest
+        if macro:
+            from src.engine.macro_context import macro_header
+            logger.info(f"Сводка макро-фона заменила {macro_stats['skipped']} статей "
+                        f"(~{macro_stats['skipped_chars']} символов) в дайджесте '{analysis_type}'.")
+            digest = macro_header(macro) + digest
+
+        timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
+        page_title = f"Аналитический отчет: {analysis_type} ({timestamp})"
+        author_link = analysis_config.get("link", SUPERGROUP_LINK)
+        telegraph_client = telegraph_client or TelegraphClient(author_url=author_link)
+
+        def publish_stage1(stage1_parts: dict):
+            """Публикует страницу с 1-м этапом и заглушкой технического раздела, пока идет 2-й этап."""
+            stage1 = _clean_ai_meta_response(stage1_parts.get("stage1"))
+            if not stage1:
+                return
+            stage1_html = _stage1_page_html(page_title, stage1)
+            url = telegraph_client.create_page(title=page_title, html_content=stage1_html + STAGE2_PENDING_HTML)
+            if not url:
+                return
+            first_report.update(url=url, seconds=time.perf_counter() - started, client=telegraph_client,
+                                title=page_title, html=stage1_html, stage1=stage1, digest=digest,
+                                digest_urls=digest_urls, started_at=started_at)
+            logger.info(f"1-й этап '{analysis_type}' опубликован через {first_report['seconds']:.1f} с: {url}")
+            if on_first_report:
+                on_first_report(url)
+
+        try:
+            analysis_parts = client.run_two_stage_analysis(
+                digest=digest,
+                prompt_template=prompt_template,
+                parsing_keys=parsing_keys,
+                priority=priority,
+                on_stage1=publish_stage1 if PROGRESSIVE_PUBLISHING else None
+            )
+        except GeminiError as e:
+            error_msg = f"<b>Ошибка на 1-м этапе анализа ({analysis_type}):</b>\n<pre>{e}</pre>"
+            logger.error(error_msg)
+            return error_msg
 
         stage1_text = analysis_parts.get("stage1")
         stage2_text = analysis_parts.get("stage2")
@@ -148,36 +384,50 @@ def run_full_analysis(analysis_config: dict, analysis_type: str) -> str:
         stage2_text = _clean_ai_meta_response(stage2_text)
 
         # 2. Проверка результатов
-        if not stage1_text or "[Ошибка" in stage1_text:
-            error_msg = f"<b>Ошибка на 1-м этапе анализа ({analysis_type}):</b>\n<pre>{stage1_text or 'Нет ответа от модели.'}</pre>"
+        if not stage1_text:
+            error_msg = f"<b>Ошибка на 1-м этапе анализа ({analysis_type}):</b>\n<pre>Нет ответа от модели.</pre>"
             logger.error(error_msg)
             return error_msg
 
-        # Убираем техническую часть из первого блока
-        stage1_clean = stage1_text.split("ЗАПРОС НА ВТОРОЙ ЭТАП")[0].strip()
-
-        # 3. Формируем контент для Telegraph
-        timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
-        page_title = f"Аналитический отчет: {analysis_type} ({timestamp})"
-
-        # Собираем и очищаем весь HTML
-        # Заголовок статьи
-        full_html_content = f"<h3>{page_title}</h3>"
-        # Добавляем очищенный HTML первого этапа
-        full_html_content += _sanitize_html_for_telegraph(stage1_clean)
+        # 3. Формируем контент для Telegraph: заголовок и очищенный HTML первого этапа
+        full_html_content = _stage1_page_html(page_title, stage1_text)
 
         # Добавляем очищенный HTML второго этапa
-        if stage2_text and "[Ошибка" not in stage2_text:
+        if stage2_text:
             # Теперь просто добавляем текст, так как он уже содержит заголовок <h4>
             full_html_content += _sanitize_html_for_telegraph(stage2_text)
         else:
             # Сообщение об ошибке, если второй этап не удался
-            full_html_content += ("<h4>Технический анализ</h4><p><i>Технический анализ не был выполнен из-за ошибки "
-                                  "или отсутствия данных.</i></p>")
-        # 4. Публикация в Telegraph
-        author_link = analysis_config.get("link", SUPERGROUP_LINK)
-        telegraph_client = TelegraphClient(author_url=author_link)
-        page_url = telegraph_client.create_page(title=page_title, html_content=full_html_content)
+            full_html_content += STAGE2_FAILED_HTML
+        # 4. Публикация в Telegraph: страница 1-го этапа обновляется на месте, ссылка не меняется
+        if first_report:
+            page_url = first_report["url"]
+            if not telegraph_client.edit_page(page_url, title=page_title, html_content=full_html_content):
+                logger.error(f"Страница {page_url} осталась без технического раздела: не удалось ее обновить.")
+        else:
+            page_url = telegraph_client.create_page(title=page_title, html_content=full_html_content)
+        timings = {"first_report_s": first_report.get("seconds", time.perf_counter() - started),
+                   "complete_s": time.perf_counter() - started}
+        logger.info(f"Отчет '{analysis_type}': время до первого отчета {timings['first_report_s']:.1f} с, "
+                    f"до полного отчета {timings['complete_s']:.1f} с.")
+
+        if persist and page_url and INCREMENTAL_MODE:
+            _mark_digest_seen(analysis_type, digest_urls, seen_at=started_at)
+        if persist:
+            _archive_report(
+                analysis_type,
+                digest=digest,
+                stage1=stage1_text,
+                stage2=stage2_text,
+                html=full_html_content,
+                url=page_url,
+                usage=analysis_parts.get("usage", {}),
+                tickers=analysis_parts.get("tickers", []),
+                theses=analysis_parts.get("analysis_block"),
+                incremental=delta_stats if previous else None,
+                structured=analysis_parts.get("structured"),
+                timings=timings,
+            )
 
         if not page_url:
             return f"<b>Ошибка публикации в Telegraph.</b> Анализ ({analysis_type}) был выполнен, но не удалось создать страницу."
@@ -188,9 +438,39 @@ def run_full_analysis(analysis_config: dict, analysis_type: str) -> str:
 
     except Exception as e:
         logger.critical(f"Критическая ошибка в 'run_full_analysis': {e}", exc_info=True)
+        if first_report:
+            # Ссылка на страницу 1-го этапа уже у читателей: страница не должна остаться с заглушкой
+            return _finish_first_report(analysis_type, first_report, error=e, persist=persist)
         return f"<b>Критическая ошибка в 'run_full_analysis':</b>\n<pre>{e}</pre>"
 
 
+def _finish_first_report(analysis_type: str, first_report: dict, error: Exception, persist: bool) -> str:
+    """
+    Завершает отчет, опубликованный после 1-го этапа, если дальнейший анализ прервался ошибкой:
+    заменяет заглушку технического раздела сообщением об ошибке, архивирует 1-й этап и возвращает URL страницы.
+    """
+    page_url = first_report["url"]
+    html_content = first_report["html"] + STAGE2_FAILED_HTML
+    try:
+        if not first_report["client"].edit_page(page_url, title=first_report["title"], html_content=html_content):
+            logger.error(f"Страница {page_url} осталась без технического раздела: не удалось ее обновить.")
+    except Exception as e:
+        logger.error(f"Страница {page_url} осталась без технического раздела: {e}", exc_info=True)
+    if persist:
+        if INCREMENTAL_MODE:
+            _mark_digest_seen(analysis_type, first_report["digest_urls"], seen_at=first_report["started_at"])
+        _archive_report(
+            analysis_type,
+            digest=first_report["digest"],
+            stage1=first_report["stage1"],
+            html=html_content,
+            url=page_url,
+            error=str(error),
+            timings={"first_report_s": first_report["seconds"], "complete_s": None},
+        )
+    return page_url
+
+
 if __name__ == '__main__':
     # Этот блок полезен для быстрого локального теста
     analysis_type_to_test = "CRYPTO"
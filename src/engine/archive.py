@@ -0,0 +1,102 @@
+import gzip
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from src.config import ARCHIVE_DIR
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analysis_type TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS reports_by_type ON reports (analysis_type, created_at);
+"""
+
+
+class ReportArchive:
+    """
+    Архив отчетов: сжатые сегменты JSONL (по одному на день) и индекс на SQLite.
+
+    Каждая запись дописывается в сегмент отдельным gzip-членом, а индекс хранит ее смещение
+    и длину. Поэтому чтение одной записи — это seek и распаковка нескольких килобайт,
+    а списки по типу анализа и времени строятся только по индексу, без распаковки.
+    Сегменты только дописываются; запись сериализуется транзакцией индекса,
+    так что в архив могут писать несколько процессов.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.sqlite3"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def append(self, record: dict) -> int:
+        """Дописывает запись в архив. record должен содержать analysis_type; возвращает id записи."""
+        created_at = record.setdefault("created_at", time.time())
+        segment = f"{datetime.fromtimestamp(created_at):%Y-%m-%d}.jsonl.gz"
+        payload = gzip.compress((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                with open(self.root / segment, "ab") as file:
+                    offset = file.tell()
+                    file.write(payload)
+                cursor = conn.execute(
+                    "INSERT INTO reports (analysis_type, created_at, segment, offset, length, url) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record["analysis_type"], created_at, segment, offset, len(payload), record.get("url"))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return cursor.lastrowid
+
+    def latest(self, analysis_type: str, limit: int = 5, only_published: bool = False) -> list[dict]:
+        """Последние записи индекса по типу анализа, от новых к старым (без чтения сегментов)."""
+        query = "SELECT * FROM reports WHERE analysis_type = ?"
+        if only_published:
+            query += " AND url IS NOT NULL"
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, (analysis_type, limit)).fetchall()]
+
+    def load(self, entry: dict) -> dict:
+        """Читает полную запись по строке индекса."""
+        with open(self.root / entry["segment"], "rb") as file:
+            file.seek(entry["offset"])
+            payload = file.read(entry["length"])
+        return json.loads(gzip.decompress(payload))
+
+
+_default_archive: ReportArchive | None = None
+
+
+def get_report_archive() -> ReportArchive:
+    """Архив по пути ARCHIVE_DIR, общий для процесса."""
+    global _default_archive
+    if _default_archive is None:
+        _default_archive = ReportArchive(ARCHIVE_DIR)
+    return _default_archive
@@ -0,0 +1,157 @@
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from src.config import JOB_QUEUE_PATH
+# Приоритеты общие с допуском запросов к Gemini: меньшее значение забирается раньше
+from src.services.admission import PRIORITY_SCHEDULED, PRIORITY_MANUAL
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analysis_type TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    reply TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_until REAL,
+    result TEXT,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_undelivered ON jobs (delivered, status);
+"""
+
+
+class JobQueue:
+    """
+    Надежная очередь задач анализа на SQLite.
+
+    Бот ставит задачи (enqueue), воркеры атомарно забирают их с арендой (claim),
+    продлевают аренду во время работы и записывают результат (complete).
+    Задача, аренда которой истекла (воркер упал), снова становится доступной,
+    пока не исчерпано max_attempts. Процесс бота забирает готовые результаты
+    (fetch_finished) и отмечает их доставленными.
+
+    Файл базы может лежать на общем диске: воркеры на других хостах работают
+    с той же очередью (файловая система должна поддерживать блокировки SQLite).
+    """
+
+    def __init__(self, path: Path, max_attempts: int = 3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, analysis_type: str, origin: str, priority: int, reply: dict | None = None) -> int:
+        """Ставит задачу в очередь. reply — куда ответить администратору (chat_id, message_id)."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (analysis_type, origin, priority, reply, created_at) VALUES (?, ?, ?, ?, ?)",
+                (analysis_type, origin, priority, json.dumps(reply) if reply else None, time.time())
+            )
+            job_id = cursor.lastrowid
+        logger.info(f"Задача #{job_id} ({analysis_type}, {origin}) поставлена в очередь.")
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> dict | None:
+        """Атомарно забирает следующую задачу (по приоритету) или задачу с истекшей арендой."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Задачи, чьи воркеры упали и исчерпали попытки, помечаются как проваленные
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                    "result = 'Воркер не завершил задачу за отведенное число попыток.' "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts)
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY priority, id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (worker_id, now + lease_seconds, row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(row)
+
+    def extend_lease(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Продлевает аренду; False, если задачу уже забрал другой воркер."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: str, ok: bool):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                ("done" if ok else "failed", result, time.time(), job_id, worker_id)
+            )
+
+    def fetch_finished(self, limit: int = 50) -> list[dict]:
+        """Возвращает завершенные, но еще не доставленные задачи."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE delivered = 0 AND status IN ('done', 'failed') ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def mark_delivered(self, job_id: int):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET delivered = 1 WHERE id = ?", (job_id,))
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["reply"] = json.loads(job["reply"]) if job["reply"] else None
+        return job
+
+
+_default_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    """Очередь по пути JOB_QUEUE_PATH, общая для процесса."""
+    global _default_queue
+    if _default_queue is None:
+        _default_queue = JobQueue(JOB_QUEUE_PATH)
+    return _default_queue
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+from src.config import CACHE_DIR, MACRO_TOPICS, MACRO_MAX_ARTICLES, MACRO_TTL_MINUTES
+from src.models import Article
+from src.prompts import MACRO_CONTEXT_HEADER
+from src.services.admission import PRIORITY_MANUAL
+from src.services.news_collector import iter_topic_news, dedupe_articles, rank_articles
+
+logger = logging.getLogger(__name__)
+
+
+def _title_key(title: str) -> str:
+    return " ".join(title.lower().split())
+
+
+class MacroContextCache:
+    """
+    Сводка макроэкономического фона, общая для всех типов анализа в пределах ttl_seconds.
+
+    Хранится в памяти процесса и в файле (его видят воркеры и перезапущенный бот).
+    Вычисление выполняется под блокировкой: параллельные анализы в процессе ждут
+    первую сводку, а не запрашивают свою.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self._context: dict | None = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, context: dict | None) -> bool:
+        return bool(context) and time.time() - context["created_at"] < self.ttl_seconds
+
+    def _load(self) -> dict | None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать сводку макро-фона {self.path}: {e}")
+            return None
+
+    def _save(self, context: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(context, f, ensure_ascii=False)
+        # Замена атомарна: читатели видят либо старую, либо новую сводку целиком
+        os.replace(tmp_path, self.path)
+
+    def get_or_compute(self, compute: Callable[[], dict | None]) -> dict | None:
+        with self._lock:
+            if self._is_fresh(self._context):
+                return self._context
+            stored = self._load()
+            if self._is_fresh(stored):
+                self._context = stored
+                return stored
+            context = compute()
+            if context:
+                self._context = context
+                try:
+                    self._save(context)
+                except OSError as e:
+                    logger.warning(f"Не удалось сохранить сводку макро-фона: {e}")
+            return context
+
+
+def _macro_digest(articles: list[Article]) -> str:
+    return "\n".join(f"- {article.title} ({article.publisher}): {article.text[:300] or 'нет описания'}"
+                     for article in articles)
+
+
+def compute_macro_context(gemini_client, gnews_instance=None, priority: int = PRIORITY_MANUAL) -> dict | None:
+    """Собирает новости по MACRO_TOPICS и получает у модели их сводку. None — новостей нет или модель недоступна."""
+    from src.services.gemini_client import GeminiError
+    started = time.perf_counter()
+    config = {"news_sources": ["google"], "news_topics": MACRO_TOPICS}
+    articles = list(rank_articles(dedupe_articles(iter_topic_news(config, gnews_instance=gnews_instance)),
+                                  MACRO_MAX_ARTICLES))
+    if not articles:
+        return None
+    usage = {}
+    try:
+        summary = gemini_client.run_macro_summary(_macro_digest(articles), priority=priority, usage=usage).strip()
+    except GeminiError as e:
+        logger.error(f"Сводка макро-фона не получена, анализ продолжится без нее: {e}")
+        return None
+    if not summary:
+        return None
+    logger.info(f"Сводка макро-фона по {len(articles)} новостям готова за {time.perf_counter() - started:.1f} с "
+                f"({usage.get('prompt_tokens', 0)} входных токенов).")
+    return {
+        "created_at": time.time(),
+        "summary": summary,
+        "count": len(articles),
+        "urls": [article.url for article in articles],
+        "titles": [_title_key(article.title) for article in articles],
+    }
+
+
+def without_macro_articles(articles: Iterable[Article], context: dict, stats: dict | None = None) -> Iterator[Article]:
+    """Этап конвейера: пропускает статьи, уже учтенные в сводке (по URL или заголовку)."""
+    stats = stats if stats is not None else {}
+    stats.update(skipped=0, skipped_chars=0)
+    urls, titles = set(context["urls"]), set(context["titles"])
+    for article in articles:
+        if article.url in urls or _title_key(article.title) in titles:
+            stats["skipped"] += 1
+            stats["skipped_chars"] += len(article.title) + len(article.text)
+            continue
+        yield article
+
+
+def macro_header(context: dict) -> str:
+    return MACRO_CONTEXT_HEADER.format(
+        created_at=datetime.fromtimestamp(context["created_at"]).strftime("%d.%m.%Y %H:%M"),
+        count=context["count"],
+        summary=context["summary"],
+    )
+
+
+_default_cache: MacroContextCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_macro_context(gemini_client, gnews_instance=None, priority: int = PRIORITY_MANUAL) -> dict | None:
+    """Сводка текущего окна: из памяти, из файла CACHE_DIR/macro_context.json или вычисленная заново."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = MacroContextCache(CACHE_DIR / "macro_context.json", ttl_seconds=MACRO_TTL_MINUTES * 60)
+    return _default_cache.get_or_compute(lambda: compute_macro_context(gemini_client, gnews_instance, priority))
@@ -0,0 +1,166 @@
+"""
+Профилирование одного запуска анализа по команде /profile.
+
+Анализ выполняется под cProfile (функции по суммарному времени в потоке анализа) и
+tracemalloc (пик памяти по местам выделения), а отдельный поток с интервалом
+sample_interval снимает стеки всех потоков, запущенных во время анализа, и собирает
+их в формате collapsed stacks для flamegraph.pl / speedscope.
+
+Модуль импортируется только командой /profile: обычные запуски не несут накладных
+расходов на профилирование.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+# Не чаще, чем раз в столько секунд, снимается снимок tracemalloc при росте памяти
+_SNAPSHOT_INTERVAL = 1.0
+# Новый снимок — только если память выросла на эту долю относительно предыдущего
+_SNAPSHOT_GROWTH = 1.1
+
+_profile_lock = threading.Lock()
+
+
+class ProfileBusy(Exception):
+    """Профилирование уже выполняется (cProfile и tracemalloc — одни на процесс)."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    # ';' и пробел — разделители формата collapsed stacks
+    return f"{module}:{code.co_qualname}".replace(";", ",").replace(" ", "_")
+
+
+class StackSampler(threading.Thread):
+    """
+    Периодически снимает стеки потоков из sys._current_frames(). Учитываются поток
+    анализа и потоки, появившиеся после старта (сбор новостей, загрузка статей и т.п.).
+    Заодно снимает снимок tracemalloc вблизи пика памяти.
+    """
+
+    def __init__(self, target_thread: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target_thread = target_thread
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.peak_snapshot: tracemalloc.Snapshot | None = None
+        self._baseline = {thread.ident for thread in threading.enumerate()} - {target_thread}
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def _take_snapshot_if_growing(self, state: dict):
+        current, _ = tracemalloc.get_traced_memory()
+        now = time.monotonic()
+        if current > state["size"] * _SNAPSHOT_GROWTH and now - state["at"] >= _SNAPSHOT_INTERVAL:
+            self.peak_snapshot = tracemalloc.take_snapshot()
+            state.update(size=current, at=now)
+
+    def run(self):
+        names = {}
+        snapshot_state = {"size": 0, "at": 0.0}
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident or ident in self._baseline:
+                    continue
+                if ident not in names:
+                    names.update((thread.ident, thread.name.replace(" ", "_")) for thread in threading.enumerate())
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+            self._take_snapshot_if_growing(snapshot_state)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _top_functions(profiler: cProfile.Profile, limit: int) -> str:
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return output.getvalue()
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot | None, limit: int) -> str:
+    if snapshot is None:
+        return "Снимок памяти не получен.\n"
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    lines = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:10.1f} КиБ {stat.count:8d} блоков  {frame.filename}:{frame.lineno}")
+    return "\n".join(lines) + "\n"
+
+
+def profile_call(func: Callable[[], str], sample_interval: float = 0.01, top_n: int = 30) -> dict:
+    """
+    Выполняет func() под профилировщиками.
+
+    Возвращает словарь: result (результат func), wall_s, peak_kib, samples,
+    report (текстовый отчет: функции по cumulative time и места выделения памяти у пика),
+    collapsed (стеки в формате collapsed stacks).
+
+    Raises:
+        ProfileBusy: другое профилирование еще не завершено.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfileBusy("Профилирование уже выполняется.")
+    try:
+        tracemalloc_was_tracing = tracemalloc.is_tracing()
+        if not tracemalloc_was_tracing:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        sampler = StackSampler(threading.get_ident(), sample_interval)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            result = func()
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - started
+            sampler.stop()
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracemalloc_was_tracing:
+                tracemalloc.stop()
+
+        report = (
+            f"Время выполнения: {wall:.2f} с, пик памяти (tracemalloc): {peak / 1024 / 1024:.1f} МиБ, "
+            f"сэмплов стеков: {sampler.samples}\n\n"
+            f"=== Функции по суммарному времени (поток анализа) ===\n{_top_functions(profiler, top_n)}\n"
+            f"=== Память по местам выделения (снимок у пика) ===\n{_top_allocations(sampler.peak_snapshot, top_n)}"
+        )
+        logger.info(f"Профилирование завершено за {wall:.2f} с: пик памяти {peak / 1024 / 1024:.1f} МиБ, "
+                    f"{sampler.samples} сэмплов стеков.")
+        return {
+            "result": result,
+            "wall_s": wall,
+            "peak_kib": peak / 1024,
+            "samples": sampler.samples,
+            "report": report,
+            "collapsed": sampler.collapsed(),
+        }
+    finally:
+        _profile_lock.release()
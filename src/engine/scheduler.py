@@ -1,8 +1,8 @@
 from apscheduler.schedulers.blocking import BlockingScheduler
-from src.bot.handlers import send_report
-from src.engine.analyzer import run_full_analysis
-from src.config import CHAT_ID, TOPIC_CONFIGS
-from datetime import datetime
+from src.bot.handlers import send_report, run_full_analysis, format_report_message
+from src.config import CHAT_ID, TOPIC_CONFIGS, QUEUE_MODE
+from src.services.admission import PRIORITY_SCHEDULED
+from src.bot.broadcaster import start_report_broadcast
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,35 +25,46 @@ def send_analysis_report_job(analysis_type: str):
             f"CHAT_ID или ID топика для '{analysis_type}' не настроены в .env. Отчет по расписанию не может быть отправлен.")
         return
 
+    if QUEUE_MODE:
+        # Анализ выполнит воркер; отчет отправит цикл доставки (src/bot/delivery.py)
+        from src.engine.job_queue import get_job_queue
+        get_job_queue().enqueue(analysis_type, origin="scheduled", priority=PRIORITY_SCHEDULED)
+        return
+
     try:
+        sent_urls = []
+
+        def send_first_report(url: str):
+            # PROGRESSIVE_PUBLISHING: отчет отправляется после 1-го этапа, страница дополнится на месте
+            report_message = format_report_message(analysis_type, url)
+            send_report([report_message], CHAT_ID, topic_id)
+            sent_urls.append(url)
+            logger.info(f"✅ Отчет '{analysis_type}' по расписанию отправлен после 1-го этапа.")
+            start_report_broadcast(analysis_type, url, report_message)
+
         # 1. Получаем URL статьи от анализатора
-        telegraph_url = run_full_analysis(analysis_config, analysis_type)
+        telegraph_url = run_full_analysis(analysis_config, analysis_type, priority=PRIORITY_SCHEDULED,
+                                          on_first_report=send_first_report)
 
         # 2. Проверяем результат и формируем сообщение
         if not telegraph_url or not telegraph_url.startswith("http"):
             logger.error(f"Анализ '{analysis_type}' завершился с ошибкой или пустым результатом. Отчет не отправлен. "
                          f"Результат: {telegraph_url}")
             return
+        if telegraph_url in sent_urls:
+            logger.info(f"✅ Страница отчета '{analysis_type}' по расписанию дополнена техническим анализом.")
+            return
 
         # 3. Формируем красивое сообщение, как в ручном режиме
-        current_time = datetime.now().strftime('%d.%m.%Y %H:%M')
-        disclaimer = (
-            f"\n\n—\n"
-            f"<i><b>⚠️ Дисклеймер:</b> Данный анализ сгенерирован автоматически и не является "
-            f"инвестиционной рекомендацией. Инвестиции сопряжены с риском. "
-            f"Принимайте решения обдуманно.</i>\n\n"
-            f"<code>Отчет сформирован: {current_time}</code>"
-        )
-        report_message = (
-            f"<b>Анализ по теме: {analysis_type}</b>\n\n"
-            f"<a href='{telegraph_url}'><b>➡️ Читать полный анализ</b></a>"
-            f"{disclaimer}"
-        )
+        report_message = format_report_message(analysis_type, telegraph_url)
 
         send_report([report_message], CHAT_ID, topic_id)
 
         logger.info(f"✅ Отчет '{analysis_type}' по расписанию успешно отправлен.")
 
+        # 4. Рассылка подписчикам — один раз на отчет, в фоне
+        start_report_broadcast(analysis_type, telegraph_url, report_message)
+
     except Exception as e:
         logger.critical(f"❌ Критическая ошибка при выполнении анализа '{analysis_type}' по расписанию: {e}",
                         exc_info=True)
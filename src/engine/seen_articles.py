@@ -0,0 +1,97 @@
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from src.config import CACHE_DIR
+from src.models import Article
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    analysis_type TEXT NOT NULL,
+    url TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (analysis_type, url)
+);
+"""
+
+
+class SeenArticles:
+    """
+    Время, когда статья впервые попала в дайджест опубликованного отчета, отдельно по типам анализа.
+    Записи старше retention_seconds удаляются.
+    """
+
+    def __init__(self, path: Path, retention_seconds: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention_seconds = retention_seconds
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, analysis_type: str, urls: list[str], seen_at: float | None = None):
+        """Отмечает адреса как попавшие в отчет в момент seen_at (для уже отмеченных время не меняется)."""
+        if not urls:
+            return
+        seen_at = seen_at if seen_at is not None else time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO seen (analysis_type, url, first_seen) VALUES (?, ?, ?)",
+                             [(analysis_type, url, seen_at) for url in urls])
+
+    def first_seen(self, analysis_type: str, urls: list[str]) -> dict[str, float]:
+        """Время, когда адреса впервые попали в отчет; адресов, которых в отчетах не было, в результате нет."""
+        if not urls:
+            return {}
+        placeholders = ",".join("?" * len(urls))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT url, first_seen FROM seen WHERE analysis_type = ? AND url IN ({placeholders})",
+                (analysis_type, *urls)
+            ).fetchall()
+        return dict(rows)
+
+    def prune(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM seen WHERE first_seen < ?", (time.time() - self.retention_seconds,))
+
+    def filter_new(self, analysis_type: str, articles: Iterable[Article], since: float | None,
+                   stats: dict | None = None, batch_size: int = 100) -> Iterator[Article]:
+        """
+        Этап конвейера: пропускает статьи, которые не попадали в отчеты до since (при since=None — все).
+        Статьи здесь не отмечаются: анализатор вызывает record только для дайджеста опубликованного отчета.
+        В stats накапливаются new/skipped (число статей) и skipped_chars.
+        """
+        stats = stats if stats is not None else {}
+        stats.update(new=0, skipped=0, skipped_chars=0)
+        articles = iter(articles)
+        while batch := list(islice(articles, batch_size)):
+            first_seen = self.first_seen(analysis_type, [article.url for article in batch])
+            for article in batch:
+                if since is None or first_seen.get(article.url, float("inf")) > since:
+                    stats["new"] += 1
+                    yield article
+                else:
+                    stats["skipped"] += 1
+                    stats["skipped_chars"] += len(article.title) + len(article.text)
+
+
+_default_seen: SeenArticles | None = None
+
+
+def get_seen_articles() -> SeenArticles:
+    """Хранилище по пути CACHE_DIR/seen_articles.sqlite3, общее для процесса."""
+    global _default_seen
+    if _default_seen is None:
+        _default_seen = SeenArticles(CACHE_DIR / "seen_articles.sqlite3")
+        _default_seen.prune()
+    return _default_seen
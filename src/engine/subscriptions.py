@@ -0,0 +1,176 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from src.config import SUBSCRIPTIONS_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    analysis_type TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    subscribed_at REAL NOT NULL,
+    PRIMARY KEY (analysis_type, chat_id)
+);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analysis_type TEXT NOT NULL,
+    report_key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    UNIQUE (analysis_type, report_key)
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    broadcast_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated_at REAL,
+    PRIMARY KEY (broadcast_id, chat_id)
+);
+CREATE INDEX IF NOT EXISTS deliveries_pending ON deliveries (broadcast_id, status);
+"""
+
+
+class SubscriptionRegistry:
+    """
+    Подписки чатов и пользователей на отчеты по типам анализа и контрольные точки рассылок.
+
+    Рассылка (broadcast) создается один раз на отчет (analysis_type, report_key) и фиксирует
+    список получателей в deliveries со статусом 'pending'. По мере отправки статусы меняются
+    на 'sent', 'failed' или 'blocked'; после сбоя процесса рассылка продолжается с тех, кто
+    остался в 'pending'.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def subscribe(self, analysis_type: str, chat_id: int) -> bool:
+        """Возвращает False, если подписка уже была."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO subscribers (analysis_type, chat_id, subscribed_at) VALUES (?, ?, ?)",
+                (analysis_type, chat_id, time.time())
+            )
+            return cursor.rowcount > 0
+
+    def unsubscribe(self, analysis_type: str, chat_id: int) -> bool:
+        """Возвращает False, если подписки не было."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM subscribers WHERE analysis_type = ? AND chat_id = ?",
+                                  (analysis_type, chat_id))
+            return cursor.rowcount > 0
+
+    def unsubscribe_chat(self, chat_id: int) -> int:
+        """Удаляет все подписки чата (бот заблокирован или удален из чата)."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,)).rowcount
+
+    def subscriptions(self, chat_id: int) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT analysis_type FROM subscribers WHERE chat_id = ? ORDER BY analysis_type",
+                                (chat_id,)).fetchall()
+        return [row["analysis_type"] for row in rows]
+
+    def subscriber_count(self, analysis_type: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM subscribers WHERE analysis_type = ?",
+                                (analysis_type,)).fetchone()[0]
+
+    def start_broadcast(self, analysis_type: str, report_key: str, text: str) -> int | None:
+        """
+        Создает рассылку отчета и фиксирует получателей. Для уже созданной рассылки того же
+        отчета возвращает ее id (повторная доставка не дублирует сообщения). None — нет подписчиков.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id FROM broadcasts WHERE analysis_type = ? AND report_key = ?",
+                                   (analysis_type, report_key)).fetchone()
+                if row:
+                    conn.execute("COMMIT")
+                    return row["id"]
+                if not conn.execute("SELECT 1 FROM subscribers WHERE analysis_type = ? LIMIT 1",
+                                    (analysis_type,)).fetchone():
+                    conn.execute("COMMIT")
+                    return None
+                broadcast_id = conn.execute(
+                    "INSERT INTO broadcasts (analysis_type, report_key, text, created_at) VALUES (?, ?, ?, ?)",
+                    (analysis_type, report_key, text, now)
+                ).lastrowid
+                conn.execute(
+                    "INSERT INTO deliveries (broadcast_id, chat_id) "
+                    "SELECT ?, chat_id FROM subscribers WHERE analysis_type = ?",
+                    (broadcast_id, analysis_type)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return broadcast_id
+
+    def get_broadcast(self, broadcast_id: int) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished_broadcasts(self) -> list[int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id").fetchall()
+        return [row["id"] for row in rows]
+
+    def pending_recipients(self, broadcast_id: int) -> list[int]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chat_id FROM deliveries WHERE broadcast_id = ? AND status = 'pending' ORDER BY chat_id",
+                (broadcast_id,)
+            ).fetchall()
+        return [row["chat_id"] for row in rows]
+
+    def record_deliveries(self, broadcast_id: int, results: list[tuple[int, str]]):
+        """Контрольная точка: статусы ('sent', 'failed', 'blocked') отправленных сообщений."""
+        if not results:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE deliveries SET status = ?, updated_at = ? WHERE broadcast_id = ? AND chat_id = ?",
+                [(status, now, broadcast_id, chat_id) for chat_id, status in results]
+            )
+
+    def finish_broadcast(self, broadcast_id: int) -> dict[str, int]:
+        """Отмечает рассылку завершенной и возвращает число доставок по статусам."""
+        with self._connect() as conn:
+            conn.execute("UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ?",
+                         (time.time(), broadcast_id))
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM deliveries WHERE broadcast_id = ? GROUP BY status",
+                                (broadcast_id,)).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+_default_registry: SubscriptionRegistry | None = None
+_default_lock = threading.Lock()
+
+
+def get_subscription_registry() -> SubscriptionRegistry:
+    """Реестр по пути SUBSCRIPTIONS_PATH, общий для процесса."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = SubscriptionRegistry(SUBSCRIPTIONS_PATH)
+        return _default_registry
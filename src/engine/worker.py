@@ -0,0 +1,67 @@
+import logging
+import socket
+import threading
+import time
+from src.config import (TOPIC_CONFIGS, JOB_QUEUE_PATH, WORKER_POLL_INTERVAL, WORKER_LEASE_SECONDS,
+                        LOG_LEVEL, LOG_FORMAT)
+from src.engine.job_queue import JobQueue, get_job_queue
+from src.logging_setup import log_context, setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _keep_lease(queue: JobQueue, job_id: int, worker_id: str, stop: threading.Event):
+    """Продлевает аренду задачи, пока идет анализ, чтобы ее не забрал другой воркер."""
+    while not stop.wait(WORKER_LEASE_SECONDS / 3):
+        if not queue.extend_lease(job_id, worker_id, WORKER_LEASE_SECONDS):
+            logger.warning(f"Аренда задачи #{job_id} потеряна воркером {worker_id}.")
+            return
+
+
+def process_job(queue: JobQueue, job: dict, worker_id: str):
+    """Выполняет одну задачу анализа и записывает результат в очередь."""
+    from src.engine.analyzer import run_full_analysis
+
+    analysis_type = job["analysis_type"]
+    analysis_config = TOPIC_CONFIGS.get(analysis_type)
+    if not analysis_config:
+        queue.complete(job["id"], worker_id, f"Конфигурация для анализа '{analysis_type}' не найдена.", ok=False)
+        return
+
+    with log_context(analysis_type=analysis_type, run_id=f"job-{job['id']}"):
+        logger.info(f"Воркер {worker_id} взял задачу #{job['id']} ({analysis_type}), попытка {job['attempts'] + 1}.")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_lease, args=(queue, job["id"], worker_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_full_analysis(analysis_config, analysis_type, priority=job["priority"])
+        except Exception as e:
+            logger.critical(f"Критическая ошибка в задаче #{job['id']}: {e}", exc_info=True)
+            result = f"<b>Критическая ошибка в воркере:</b>\n<pre>{e}</pre>"
+        finally:
+            stop.set()
+        ok = bool(result) and result.startswith("http")
+        queue.complete(job["id"], worker_id, result, ok=ok)
+        logger.info(f"Задача #{job['id']} ({analysis_type}) завершена {'успешно' if ok else 'с ошибкой'}.")
+
+
+def run_worker(worker_id: str | None = None):
+    """
+    Цикл воркера: забирает задачи из общей очереди и выполняет анализ.
+    Может запускаться на другом хосте, если JOB_QUEUE_PATH указывает на общую базу.
+    """
+    # Процесс, запущенный через spawn, не наследует настройку логгирования родителя
+    setup_logging(LOG_LEVEL, LOG_FORMAT)
+    worker_id = worker_id or f"{socket.gethostname()}-{threading.get_native_id()}"
+    queue = get_job_queue()
+    logger.info(f"Воркер анализа {worker_id} запущен, очередь: {JOB_QUEUE_PATH}")
+    while True:
+        try:
+            job = queue.claim(worker_id, WORKER_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"Воркер {worker_id} не смог обратиться к очереди: {e}", exc_info=True)
+            job = None
+        if job is None:
+            time.sleep(WORKER_POLL_INTERVAL)
+            continue
+        process_job(queue, job, worker_id)
@@ -0,0 +1,186 @@
+"""
+Офлайн-нагрузочный прогон конвейера анализа на локальных заглушках.
+
+Запускает N параллельных сценариев `run_full_analysis` (flow=analysis) или
+полного сценария команды /run_analysis (flow=command) и печатает
+p50/p95/p99 сквозной задержки и пропускную способность.
+
+Пример:
+    python -m src.loadtest.driver --flows 50 --concurrency 10 --gemini-median 2 --gemini-p99 8 --time-scale 0.1
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Переменные окружения должны быть заданы до импорта src.config
+os.environ.setdefault("BOT_TOKEN", "123456:offline-load-harness")
+os.environ.setdefault("ADMIN_ID", "1000")
+os.environ.setdefault("SUPERGROUP_ID", "-1001")
+# Прогоны на заглушках не должны засорять архив настоящих отчетов
+os.environ.setdefault("ARCHIVE_ENABLED", "false")
+# Лимиты RPM/TPM рассчитаны на настоящую квоту; для заглушек они включаются явно
+os.environ.setdefault("GEMINI_RPM", "0")
+os.environ.setdefault("GEMINI_TPM", "0")
+# Данные заглушек не должны попадать в общий кэш технических данных и менять ход следующих прогонов
+os.environ.setdefault("TICKER_SNAPSHOT_CACHE", "false")
+for _topic_env, _topic_id in (("USA_STOCKS_ID", "11"), ("CRYPTO_ID", "12"), ("CURRENCY_ID", "13")):
+    os.environ.setdefault(_topic_env, _topic_id)
+
+from src.config import TOPIC_CONFIGS, ADMIN_ID, CHAT_ID  # noqa: E402
+from src.loadtest.fakes import (  # noqa: E402
+    LatencyModel, FakeGNews, FakeGenAIClient, FakeTelegraph, FakeTeleBot, make_fake_message
+)
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Перцентиль с линейной интерполяцией по отсортированному списку."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class FakeServices:
+    """Набор заглушек, общий для всех сценариев одного прогона."""
+
+    def __init__(self, args):
+        scale = args.time_scale
+        self.gnews = FakeGNews(
+            articles_per_topic=args.articles_per_topic,
+            latency=LatencyModel(args.gnews_median, args.gnews_p99, scale),
+            error_rate=args.gnews_error_rate, seed=args.seed,
+        )
+        self.genai = FakeGenAIClient(
+            latency=LatencyModel(args.gemini_median, args.gemini_p99, scale),
+            error_rate=args.gemini_error_rate, seed=args.seed,
+        )
+        self.telegraph = FakeTelegraph(
+            latency=LatencyModel(args.telegraph_median, args.telegraph_p99, scale),
+            error_rate=args.telegraph_error_rate, seed=args.seed,
+        )
+        self.bot = FakeTeleBot(
+            latency=LatencyModel(args.telegram_median, args.telegram_p99, scale),
+            error_rate=args.telegram_error_rate, seed=args.seed,
+        )
+
+    def analysis_kwargs(self) -> dict:
+        from src.services.gemini_client import GeminiClient
+        from src.services.telegraph_client import TelegraphClient
+        return {
+            "gemini_client": GeminiClient(client=self.genai),
+            "telegraph_client": TelegraphClient(client=self.telegraph),
+            "gnews_instance": self.gnews,
+        }
+
+
+def _analysis_flow(services: FakeServices, analysis_type: str, flow_id: int) -> bool:
+    from src.engine.analyzer import run_full_analysis
+    result = run_full_analysis(TOPIC_CONFIGS[analysis_type], analysis_type, **services.analysis_kwargs())
+    return result.startswith("http")
+
+
+def _command_flow(services: FakeServices, analysis_type: str, flow_id: int) -> bool:
+    """
+    Выполняет тело команды /run_analysis (то, что обработчик запускает в отдельном потоке)
+    синхронно, чтобы задержка включала анализ, ответы бота и отправку отчета.
+    """
+    from src.bot import handlers
+    message = make_fake_message(f"/run_analysis {analysis_type}", user_id=int(ADMIN_ID),
+                                chat_id=int(ADMIN_ID), message_id=flow_id)
+    sent_before = len(services.bot.calls)
+    handlers._run_analysis_in_thread(message, TOPIC_CONFIGS[analysis_type], analysis_type,
+                                     TOPIC_CONFIGS[analysis_type]["id"])
+    # Успех — если отчет ушел в целевой чат
+    return any(
+        call["method"] == "send_message" and str(call["payload"]["chat_id"]) == CHAT_ID and not call["error"]
+        for call in services.bot.calls[sent_before:]
+    )
+
+
+def _install_command_fakes(services: FakeServices):
+    """Подменяет бота и фабрику анализа в модуле обработчиков на заглушки."""
+    from src.bot import handlers
+    from src.engine.analyzer import run_full_analysis
+    handlers.bot = services.bot
+    handlers.run_full_analysis = lambda config, analysis_type, **kwargs: run_full_analysis(
+        config, analysis_type, **services.analysis_kwargs(), **kwargs
+    )
+
+
+def run_load(args) -> dict:
+    services = FakeServices(args)
+    flow = _command_flow if args.flow == "command" else _analysis_flow
+    if args.flow == "command":
+        _install_command_fakes(services)
+
+    types = args.types or list(TOPIC_CONFIGS.keys())
+    latencies: list[float] = []
+    failures = 0
+
+    def timed(flow_id: int) -> tuple[float, bool]:
+        started = time.perf_counter()
+        ok = flow(services, types[flow_id % len(types)], flow_id)
+        return time.perf_counter() - started, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for elapsed, ok in pool.map(timed, range(args.flows)):
+            latencies.append(elapsed)
+            failures += not ok
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "flow": args.flow,
+        "flows": args.flows,
+        "concurrency": args.concurrency,
+        "failures": failures,
+        "wall_s": wall,
+        "throughput_per_s": args.flows / wall if wall else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "calls": {
+            "gnews": len(services.gnews.calls),
+            "gemini": len(services.genai.calls),
+            "telegraph": len(services.telegraph.calls),
+            "telegram": len(services.bot.calls),
+        },
+    }
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-нагрузочный прогон конвейера анализа.")
+    parser.add_argument("--flow", choices=["analysis", "command"], default="analysis",
+                        help="analysis — run_full_analysis, command — сценарий /run_analysis")
+    parser.add_argument("--flows", type=int, default=20, help="Общее число сценариев")
+    parser.add_argument("--concurrency", type=int, default=5, help="Число одновременных сценариев")
+    parser.add_argument("--types", nargs="*", help="Типы анализа (по умолчанию все из TOPIC_CONFIGS)")
+    parser.add_argument("--articles-per-topic", type=int, default=20)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Множитель всех задержек")
+    parser.add_argument("--seed", type=int, default=None)
+    for name, median, p99 in (("gnews", 0.3, 1.5), ("gemini", 20.0, 90.0),
+                              ("telegraph", 0.4, 2.0), ("telegram", 0.1, 0.5)):
+        parser.add_argument(f"--{name}-median", type=float, default=median, help="Медиана задержки, с")
+        parser.add_argument(f"--{name}-p99", type=float, default=p99, help="99-й перцентиль задержки, с")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help="Доля вызовов с ошибкой")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr)
+    report = run_load(_parse_args())
+    print(f"Сценарий: {report['flow']}, всего: {report['flows']}, параллельно: {report['concurrency']}, "
+          f"ошибок: {report['failures']}")
+    print(f"Время прогона: {report['wall_s']:.2f} с, пропускная способность: "
+          f"{report['throughput_per_s']:.2f} сценариев/с")
+    print(f"Задержка p50: {report['p50_s']:.2f} с, p95: {report['p95_s']:.2f} с, p99: {report['p99_s']:.2f} с")
+    print(f"Вызовы заглушек: {report['calls']}")
@@ -0,0 +1,319 @@
+"""
+Локальные заглушки внешних сервисов (GNews, genai.Client, Telegraph, telebot.TeleBot)
+для офлайн-нагрузочного тестирования конвейера.
+
+Каждая заглушка имитирует задержку по заданному распределению, с заданной
+вероятностью возвращает ошибку того же типа, что и настоящий сервис,
+и записывает все вызовы в список `calls`.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.genai.errors import ServerError
+from telebot.apihelper import ApiTelegramException
+from telegraph.exceptions import TelegraphException
+
+
+class LatencyModel:
+    """
+    Логнормальное распределение задержки, заданное медианой и 99-м перцентилем (в секундах).
+    Если p99 не задан или равен медиане, задержка постоянная.
+    time_scale позволяет "ускорить" прогон, сохранив форму распределения.
+    """
+
+    def __init__(self, median: float = 0.0, p99: float | None = None, time_scale: float = 1.0):
+        self.median = median
+        self.p99 = p99
+        self.time_scale = time_scale
+        # 2.326 — z-оценка 99-го перцентиля стандартного нормального распределения
+        if median > 0 and p99 and p99 > median:
+            self._sigma = math.log(p99 / median) / 2.326
+        else:
+            self._sigma = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        if not self._sigma:
+            return self.median * self.time_scale
+        return rng.lognormvariate(math.log(self.median), self._sigma) * self.time_scale
+
+
+class _FakeService:
+    """Общая логика заглушек: задержка, ошибки и запись вызовов."""
+
+    def __init__(self, latency: LatencyModel | None = None, error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.calls: list[dict] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> tuple[float, bool]:
+        with self._lock:
+            return self.latency.sample(self._rng), self._rng.random() < self.error_rate
+
+    def _record(self, method: str, payload: dict, delay: float, failed: bool):
+        with self._lock:
+            self.calls.append({
+                "ts": time.time(),
+                "method": method,
+                "payload": payload,
+                "latency": delay,
+                "error": failed,
+            })
+
+    def _simulate(self, method: str, payload: dict) -> bool:
+        """Ждет случайную задержку, записывает вызов и возвращает True, если вызов должен упасть."""
+        delay, failed = self._draw()
+        time.sleep(delay)
+        self._record(method, payload, delay, failed)
+        return failed
+
+
+# --- GNews ---
+
+class FakeGNews(_FakeService):
+    """Заглушка gnews.GNews: отдает детерминированный набор статей по каждой теме."""
+
+    def __init__(self, articles_per_topic: int = 20, overlap: float = 0.2, **kwargs):
+        super().__init__(**kwargs)
+        self.articles_per_topic = articles_per_topic
+        # Доля статей, общих для всех тем (имитирует пересечение выдачи Google News)
+        self.overlap = overlap
+
+    def get_news_by_topic(self, topic: str) -> list[dict]:
+        if self._simulate("get_news_by_topic", {"topic": topic}):
+            raise ConnectionError(f"Имитация сбоя GNews для темы {topic}")
+
+        shared = int(self.articles_per_topic * self.overlap)
+        articles = []
+        for i in range(self.articles_per_topic):
+            key = f"shared-{i}" if i < shared else f"{topic.lower()}-{i}"
+            articles.append({
+                "title": f"Headline {key}",
+                "description": f"Summary of the {key} story with market implications.",
+                "published date": "Mon, 01 Jan 2024 09:00:00 GMT",
+                "url": f"https://news.example.com/{key}",
+                "publisher": {"href": "https://news.example.com", "title": f"Publisher {i % 7}"},
+            })
+        return articles
+
+
+# --- Gemini ---
+
+FAKE_TICKERS = ["NVDA", "AAPL", "BTC", "EUR/USD"]
+
+FAKE_STAGE1_TEXT = (
+    "<h4>КЛЮЧЕВЫЕ ТЕМЫ:</h4><p><i>Тема A, Тема B</i></p>"
+    "<h4>АНАЛИЗ И ТЕЗИСЫ:</h4><p><b>Тема 1: Тема A</b></p>"
+    "<ul><li><code>NVDA</code>: Тезис.</li></ul>"
+    "<h4>АНАЛИЗ СИЛЫ ВАЛЮТ:</h4><ul><li><b>USD:</b> 4 - <i>Тезис</i></li></ul>"
+    "<p><b>ЗАПРОС НА ВТОРОЙ ЭТАП:</b><br>"
+    + ", ".join(f"<code>{t}</code>" for t in FAKE_TICKERS) + "</p>"
+)
+
+FAKE_STAGE2_TEXT = (
+    "<h4>ТЕХНИЧЕСКИЙ АНАЛИЗ И РЕКОМЕНДАЦИИ:</h4>"
+    + "".join(
+        f"<h4>Тикер: {t}</h4><ul><li><i>Технические данные:</i> Цена: 100, MA50: 95, MA200: 90, RSI: 55</li>"
+        f"<li><i>Рекомендация:</i> Покупка</li></ul>"
+        for t in FAKE_TICKERS
+    )
+)
+
+
+FAKE_STAGE1_JSON = json.dumps({
+    "key_themes": ["Тема A", "Тема B"],
+    "top_ideas": [{"theme": "Тема A", "ticker": t, "direction": "Покупка", "horizon": "Краткосрочный",
+                   "strength": None, "thesis": "Тезис."} for t in FAKE_TICKERS],
+    "analysis": [{"title": "Тема A", "description": "Описание.",
+                  "tickers": [{"ticker": t, "thesis": "Тезис."} for t in FAKE_TICKERS]}],
+    "stage2_tickers": FAKE_TICKERS,
+}, ensure_ascii=False)
+
+FAKE_STAGE2_JSON = "```json\n" + json.dumps({
+    "recommendations": [{"ticker": t, "price": "100", "ma50": "95", "ma200": "90", "rsi": "55",
+                         "recommendation": "Покупка", "horizon": "Краткосрочный"} for t in FAKE_TICKERS],
+}, ensure_ascii=False) + "\n```"
+
+
+def _estimate_tokens(contents) -> int:
+    return max(1, len(str(contents)) // 4)
+
+
+def _overloaded_error() -> ServerError:
+    return ServerError(503, {"error": {"code": 503, "message": "Имитация перегрузки модели",
+                                       "status": "UNAVAILABLE"}})
+
+
+class _FakeModels:
+    def __init__(self, owner: "FakeGenAIClient"):
+        self._owner = owner
+
+    def generate_content(self, model: str, contents, config=None):
+        if self._owner._simulate("generate_content", {"model": model, "contents": contents}):
+            raise _overloaded_error()
+        return self._respond(contents, config)
+
+    def _respond(self, contents, config):
+        owner = self._owner
+        is_stage2 = "ТЕХНИЧЕСКИЙ" in str(contents) or "технический аналитик" in str(contents)
+        wants_json = getattr(config, "response_schema", None) is not None or '"recommendations"' in str(contents)
+        if wants_json:
+            text = FAKE_STAGE2_JSON if is_stage2 else FAKE_STAGE1_JSON
+        else:
+            text = FAKE_STAGE2_TEXT if is_stage2 else FAKE_STAGE1_TEXT
+        prompt_tokens = _estimate_tokens(contents)
+        cached_tokens = 0
+        if config is not None and getattr(config, "cached_content", None):
+            cached_tokens = owner.caches.token_count(config.cached_content)
+        elif config is not None and getattr(config, "system_instruction", None):
+            prompt_tokens += _estimate_tokens(config.system_instruction)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens + cached_tokens,
+                candidates_token_count=_estimate_tokens(text),
+                cached_content_token_count=cached_tokens,
+                total_token_count=prompt_tokens + cached_tokens + _estimate_tokens(text),
+            ),
+        )
+
+
+class _FakeAsyncModels(_FakeModels):
+    """Асинхронный вариант models (client.aio.models): задержка через asyncio.sleep, поддерживает отмену."""
+
+    async def generate_content(self, model: str, contents, config=None):
+        owner = self._owner
+        delay, failed = owner._draw()
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            owner._record("aio.generate_content.cancelled", {"model": model, "contents": contents}, delay, False)
+            raise
+        owner._record("aio.generate_content", {"model": model, "contents": contents}, delay, failed)
+        if failed:
+            raise _overloaded_error()
+        return self._respond(contents, config)
+
+
+class _FakeCaches:
+    """Хранилище объектов cached content в памяти."""
+
+    def __init__(self, owner: "FakeGenAIClient"):
+        self._owner = owner
+        self._tokens: dict[str, int] = {}
+
+    def create(self, model: str, config=None):
+        owner = self._owner
+        instruction = getattr(config, "system_instruction", "") if config is not None else ""
+        owner._record("caches.create", {"model": model, "system_instruction": instruction}, 0.0, False)
+        with owner._lock:
+            name = f"cachedContents/fake-{len(self._tokens) + 1}"
+            self._tokens[name] = _estimate_tokens(instruction)
+        return SimpleNamespace(name=name, model=model)
+
+    def update(self, name: str, config=None):
+        self._owner._record("caches.update", {"name": name}, 0.0, False)
+        return SimpleNamespace(name=name)
+
+    def token_count(self, name: str) -> int:
+        return self._tokens.get(name, 0)
+
+
+class FakeGenAIClient(_FakeService):
+    """Заглушка google.genai.Client: поддерживает models.generate_content, aio.models и caches."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.models = _FakeModels(self)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+        self.caches = _FakeCaches(self)
+
+
+# --- Telegraph ---
+
+class FakeTelegraph(_FakeService):
+    """Заглушка telegraph.Telegraph: хранит созданные страницы в памяти."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pages: dict[str, dict] = {}
+        self._counter = 0
+
+    def create_page(self, title, content=None, html_content=None, author_name=None, author_url=None,
+                    return_content=False):
+        if self._simulate("create_page", {"title": title, "html_content": html_content}):
+            raise TelegraphException("Имитация сбоя Telegraph")
+        with self._lock:
+            self._counter += 1
+            path = f"fake-report-{self._counter}"
+            self.pages[path] = {"title": title, "html_content": html_content}
+        return {"path": path, "url": f"https://telegra.ph/{path}"}
+
+    def edit_page(self, path, title, content=None, html_content=None, author_name=None, author_url=None,
+                  return_content=False):
+        if self._simulate("edit_page", {"path": path, "title": title, "html_content": html_content}):
+            raise TelegraphException("Имитация сбоя Telegraph")
+        with self._lock:
+            if path not in self.pages:
+                raise TelegraphException("PAGE_NOT_FOUND")
+            self.pages[path] = {"title": title, "html_content": html_content}
+        return {"path": path, "url": f"https://telegra.ph/{path}"}
+
+
+# --- Telegram ---
+
+class FakeTeleBot(_FakeService):
+    """
+    Заглушка telebot.TeleBot: декораторы обработчиков возвращают функцию без изменений,
+    а отправка сообщений только записывается.
+    """
+
+    def __init__(self, bot_id: int = 1, **kwargs):
+        super().__init__(**kwargs)
+        self._me = SimpleNamespace(id=bot_id, username="fake_bot")
+        self._message_id = 0
+
+    def message_handler(self, *args, **kwargs):
+        return lambda handler: handler
+
+    def get_me(self):
+        return self._me
+
+    def _send(self, method: str, chat_id, text: str, **kwargs):
+        if self._simulate(method, {"chat_id": chat_id, "text": text, **kwargs}):
+            raise ApiTelegramException(method, None, {"error_code": 429, "description": "Too Many Requests"})
+        with self._lock:
+            self._message_id += 1
+            return SimpleNamespace(message_id=self._message_id, chat=SimpleNamespace(id=chat_id), text=text)
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._send("send_message", chat_id, text, **kwargs)
+
+    def reply_to(self, message, text, **kwargs):
+        return self._send("reply_to", message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        self._simulate("delete_message", {"chat_id": chat_id, "message_id": message_id})
+        return True
+
+    def polling(self, *args, **kwargs):
+        return None
+
+
+def make_fake_message(text: str, user_id: int, chat_id: int, message_id: int, thread_id: int | None = None):
+    """Создает объект, похожий на telebot.types.Message, для вызова обработчиков напрямую."""
+    return SimpleNamespace(
+        text=text,
+        message_id=message_id,
+        message_thread_id=thread_id,
+        chat=SimpleNamespace(id=chat_id),
+        from_user=SimpleNamespace(id=user_id, username=f"user{user_id}"),
+    )
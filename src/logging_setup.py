@@ -0,0 +1,129 @@
+"""
+Неблокирующее логгирование: записи ставятся в очередь (QueueHandler), а в поток вывода
+их пишет отдельный поток QueueListener, поэтому медленный stdout не задерживает бота
+и анализ. Записи дополняются полями analysis_type и run_id из contextvars и
+выводятся в JSON (LOG_FORMAT=json) или текстом (LOG_FORMAT=text).
+
+Частые события прореживаются: запись с extra={"sample_every": N} пропускается
+один раз из N для каждого шаблона сообщения (предупреждения и ошибки — всегда).
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+_analysis_type: contextvars.ContextVar[str | None] = contextvars.ContextVar("analysis_type", default=None)
+_run_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("run_id", default=None)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(analysis_type)s %(run_id)s] %(message)s'
+
+_listener: logging.handlers.QueueListener | None = None
+_setup_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(analysis_type: str | None = None, run_id: str | None = None):
+    """
+    Задает analysis_type и run_id для всех записей внутри блока (в том числе из вложенных
+    асинхронных задач). Без run_id сохраняется текущий, а если его нет — создается новый.
+    """
+    tokens = []
+    if analysis_type is not None:
+        tokens.append((_analysis_type, _analysis_type.set(analysis_type)))
+    if run_id is not None or _run_id.get() is None:
+        tokens.append((_run_id, _run_id.set(run_id or uuid.uuid4().hex[:8])))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись analysis_type и run_id текущего контекста."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.analysis_type = _analysis_type.get() or "-"
+        record.run_id = _run_id.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает первую и затем каждую N-ю запись с extra={"sample_every": N} для каждого шаблона."""
+
+    def __init__(self):
+        super().__init__()
+        self._counts: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = getattr(record, "sample_every", None)
+        if not every or every <= 1 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, str(record.msg))
+        with self._lock:
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+        return (count - 1) % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "analysis_type": getattr(record, "analysis_type", "-"),
+            "run_id": getattr(record, "run_id", "-"),
+            "message": record.getMessage(),
+        }
+        if getattr(record, "sample_every", None):
+            payload["sample_every"] = record.sample_every
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def setup_logging(level: str | int = "INFO", log_format: str = "json", stream=None) -> logging.handlers.QueueListener:
+    """
+    Настраивает корневой логгер: QueueHandler с фильтрами контекста и прореживания
+    и QueueListener, который пишет в stream (по умолчанию stdout). Повторный вызов
+    возвращает уже запущенный listener.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+        records = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        # Фильтры работают в потоке, создавшем запись: там доступен ее контекст
+        queue_handler.addFilter(ContextFilter())
+        queue_handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        # Остановка listener дописывает оставшиеся в очереди записи
+        atexit.register(_listener.stop)
+        return _listener
@@ -0,0 +1,90 @@
+import sys
+from email.utils import parsedate_to_datetime
+
+
+def parse_published(value) -> float | None:
+    """Преобразует дату публикации из RSS (RFC 2822) во время Unix; None, если дата не распознана."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class Article:
+    """
+    Компактная модель новостной статьи.
+
+    __slots__ убирает словарь атрибутов у каждого экземпляра, а названия издателей
+    и тем интернируются: сотни статей разделяют несколько десятков одинаковых строк.
+    """
+
+    __slots__ = ("title", "text", "url", "publisher", "published", "topic")
+
+    def __init__(self, title: str, text: str, url: str, publisher: str = "N/A",
+                 published: float | None = None, topic: str | None = None):
+        self.title = title
+        self.text = text
+        self.url = url
+        self.publisher = sys.intern(publisher or "N/A")
+        self.published = published
+        self.topic = sys.intern(topic) if topic else None
+
+    @classmethod
+    def from_gnews(cls, item: dict, topic: str | None = None) -> "Article":
+        """Создает статью из элемента выдачи GNews."""
+        publisher = item.get("publisher") or {}
+        return cls(
+            title=item.get("title") or "Без заголовка",
+            text=item.get("description") or "",
+            url=item["url"],
+            publisher=publisher.get("title", "N/A") if isinstance(publisher, dict) else str(publisher),
+            published=parse_published(item.get("published date")),
+            topic=topic,
+        )
+
+    def __repr__(self) -> str:
+        return f"Article(title={self.title!r}, publisher={self.publisher!r}, url={self.url!r})"
+
+
+class Story:
+    """
+    Сюжет: группа статей об одном событии, представленная в дайджесте одной записью.
+    articles упорядочены по близости к центру сюжета, первая — самая представительная.
+    """
+
+    __slots__ = ("articles",)
+
+    def __init__(self, articles: list[Article]):
+        self.articles = articles
+
+    @property
+    def headline(self) -> str:
+        return self.articles[0].title
+
+    @property
+    def publishers(self) -> list[str]:
+        return list(dict.fromkeys(article.publisher for article in self.articles))
+
+    @property
+    def published(self) -> float | None:
+        dates = [article.published for article in self.articles if article.published]
+        return max(dates) if dates else None
+
+    def key_facts(self, limit: int = 3, max_chars: int = 400) -> list[str]:
+        """Описания из разных источников без повторов, не больше limit."""
+        facts, seen_publishers, seen_texts = [], set(), set()
+        for article in self.articles:
+            text = " ".join(article.text.split())
+            if not text or article.publisher in seen_publishers or text in seen_texts:
+                continue
+            seen_publishers.add(article.publisher)
+            seen_texts.add(text)
+            facts.append(text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "...")
+            if len(facts) == limit:
+                break
+        return facts
+
+    def __repr__(self) -> str:
+        return f"Story(headline={self.headline!r}, articles={len(self.articles)})"
@@ -240,4 +240,35 @@ CRYPTO_PROMPT = """
 <code>[Тикер 1]</code>, <code>[Тикер 2]</code>, <code>[Тикер 3]</code>, <code>[Тикер 4]</code></p>
 
 <p><i>Новостные данные:</i> [Вставь полный дайджест новостей]</p>
-"""
\ No newline at end of file
+"""
+
+INCREMENTAL_UPDATE_PROMPT = """
+<b>РЕЖИМ ОБНОВЛЕНИЯ.</b> Предыдущий отчет опубликован {previous_time}. Ниже — его краткое содержание и только те новости, которые появились после него.
+Не начинай анализ с нуля: обнови предыдущий отчет. Сохрани тезисы, которые новые новости не опровергают, скорректируй или сними те, что устарели, и добавь новые темы, только если их поддерживают новые новости. Если новых новостей нет или они несущественны, повтори предыдущие выводы. Формат ответа — тот же, что задан выше, включая тикеры для второго этапа.
+
+--- ПРЕДЫДУЩИЙ ОТЧЕТ (кратко) ---
+Тикеры: {tickers}
+{summary}
+--- КОНЕЦ ПРЕДЫДУЩЕГО ОТЧЕТА ---
+
+"""
+
+MACRO_PROMPT = """Ты — макроэкономический аналитик. Ниже — свежие новости об экономике, финансах, энергетике и геополитике.
+Составь краткую сводку макроэкономического фона. Ее получат аналитики фондового рынка США, криптовалют и валютного рынка вместо самих этих новостей, поэтому сохрани все существенные для рынков факты.
+
+Требования:
+- 6–10 пунктов, каждый — 1–2 предложения с конкретными фактами (цифры, даты, имена), без торговых рекомендаций.
+- Охвати денежно-кредитную политику (ФРС, ЕЦБ и другие центробанки), инфляцию и макростатистику, энергоносители и сырье, геополитику и торговые ограничения — в той мере, в какой о них есть новости.
+- Только обычный текст без HTML и Markdown, каждый пункт с новой строки, начиная с "- ".
+- Не добавляй фактов, которых нет в новостях.
+
+Новости:
+{digest}
+"""
+
+MACRO_CONTEXT_HEADER = """
+<b>МАКРОЭКОНОМИЧЕСКИЙ ФОН</b> (общая сводка на {created_at} по {count} новостям об экономике, центробанках, энергетике и геополитике; сами эти новости в дайджест ниже не включены):
+{summary}
+--- КОНЕЦ СВОДКИ ---
+
+"""
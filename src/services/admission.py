@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from src.config import GEMINI_RPM, GEMINI_TPM, GEMINI_ADMISSION_MAX_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньшее значение обслуживается раньше (так же упорядочена очередь задач job_queue)
+PRIORITY_SCHEDULED = 0
+PRIORITY_MANUAL = 1
+
+# Грубая оценка числа токенов по длине текста (кириллица плотнее латиницы)
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(*texts: str | None) -> int:
+    return sum(len(text) for text in texts if text) // CHARS_PER_TOKEN
+
+
+class AdmissionTimeout(Exception):
+    """Запрос не получил допуск за отведенное время."""
+
+
+class TokenBucket:
+    """Корзина токенов с пополнением rate_per_minute в минуту и емкостью в одну минуту."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Через сколько секунд в корзине будет amount (не больше емкости) токенов."""
+        deficit = min(amount, self.capacity) - self.tokens
+        return max(0.0, deficit / self.rate)
+
+    def consume(self, amount: float):
+        # Запрос крупнее емкости забирает всю корзину и уводит ее в минус
+        self.tokens -= amount
+
+    def adjust(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdmissionController:
+    """
+    Общий для процесса допуск запросов к API по лимитам RPM и TPM.
+
+    Каждый запрос перед отправкой вызывает acquire с оценкой числа токенов и приоритетом.
+    Ожидающие выстраиваются в очередь по (приоритет, порядок поступления); допуск получает
+    только первый в очереди, когда в обеих корзинах хватает токенов. После ответа settle
+    заменяет оценку фактическим расходом. rpm или tpm, равные 0, отключают соответствующий лимит.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_wait: float = 900.0, typical_tokens: float = 20000.0):
+        self._buckets = {name: TokenBucket(rate) for name, rate in (("requests", rpm), ("tokens", tpm)) if rate}
+        self.max_wait = max_wait
+        # Скользящее среднее фактического расхода на запрос — для оценки времени ожидания
+        self.typical_tokens = typical_tokens
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int, int]] = []
+        self._sequence = itertools.count()
+
+    def _wait_time(self, demand: dict[str, float]) -> float:
+        return max((bucket.wait_time(demand[name]) for name, bucket in self._buckets.items()), default=0.0)
+
+    def _refill(self):
+        now = time.monotonic()
+        for bucket in self._buckets.values():
+            bucket.refill(now)
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_MANUAL) -> float:
+        """
+        Блокирует до допуска запроса; возвращает время ожидания в секундах.
+
+        Raises:
+            AdmissionTimeout: допуск не получен за max_wait секунд.
+        """
+        started = time.monotonic()
+        entry = (priority, next(self._sequence), tokens)
+        demand = {"requests": 1, "tokens": tokens}
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    wait = None
+                    if self._waiters[0] is entry:
+                        wait = self._wait_time(demand)
+                        if wait <= 0:
+                            for name, bucket in self._buckets.items():
+                                bucket.consume(demand[name])
+                            heapq.heappop(self._waiters)
+                            return time.monotonic() - started
+                    remaining = started + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionTimeout(f"Нет допуска к API за {self.max_wait:.0f} с "
+                                               f"(в очереди {len(self._waiters)} запросов).")
+                    self._cond.wait(timeout=min(wait, remaining) if wait is not None else remaining)
+            finally:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                # Следующий в очереди проверяет, может ли он пройти
+                self._cond.notify_all()
+
+    def try_acquire(self, tokens: int) -> bool:
+        """
+        Допуск без ожидания: True, если очередь пуста и в корзинах хватает токенов.
+        Для необязательных запросов (дублей хеджирования), которые не должны ждать и вытеснять основные.
+        """
+        demand = {"requests": 1, "tokens": tokens}
+        with self._cond:
+            self._refill()
+            if self._waiters or self._wait_time(demand) > 0:
+                return False
+            for name, bucket in self._buckets.items():
+                bucket.consume(demand[name])
+            return True
+
+    def settle(self, estimated_tokens: int, actual_tokens: int | None):
+        """
+        Учитывает фактический расход токенов вместо оценки, сделанной при допуске.
+        Для запроса, завершившегося ошибкой, передается actual_tokens=0: оценка возвращается в корзину.
+        """
+        if actual_tokens is None:
+            return
+        with self._cond:
+            if actual_tokens:
+                self.typical_tokens = 0.8 * self.typical_tokens + 0.2 * actual_tokens
+            if "tokens" in self._buckets:
+                self._refill()
+                self._buckets["tokens"].adjust(estimated_tokens - actual_tokens)
+            self._cond.notify_all()
+
+    def estimate_wait(self, requests: int = 1, tokens: float | None = None,
+                      priority: int = PRIORITY_MANUAL) -> float:
+        """
+        Оценка ожидания для requests новых запросов с приоритетом priority: учитываются
+        ожидающие запросы с тем же или более высоким приоритетом и текущее наполнение корзин.
+        """
+        with self._cond:
+            self._refill()
+            demand = {"requests": float(requests),
+                      "tokens": tokens if tokens is not None else requests * self.typical_tokens}
+            for waiter_priority, _, waiter_tokens in self._waiters:
+                if waiter_priority <= priority:
+                    demand["requests"] += 1
+                    demand["tokens"] += waiter_tokens
+            waits = ((demand[name] - bucket.tokens) / bucket.rate for name, bucket in self._buckets.items())
+            # Без лимитов (GEMINI_RPM=0 и GEMINI_TPM=0) корзин нет и ждать не нужно
+            return max(0.0, max(waits, default=0.0))
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+
+_default_controller: AdmissionController | None = None
+_default_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Контроллер допуска к Gemini, общий для процесса."""
+    global _default_controller
+    with _default_lock:
+        if _default_controller is None:
+            _default_controller = AdmissionController(GEMINI_RPM, GEMINI_TPM, max_wait=GEMINI_ADMISSION_MAX_WAIT)
+        return _default_controller
@@ -0,0 +1,138 @@
+import html
+import json
+import re
+from pydantic import BaseModel, Field, ValidationError
+from src.services.prompt_cache import DIGEST_PLACEHOLDER
+
+
+class TradeIdea(BaseModel):
+    theme: str = Field(description="Тема или нарратив, из которого следует идея")
+    ticker: str = Field(description="Тикер, крипто-актив или валютная пара, например NVDA, BTC, EUR/USD")
+    direction: str = Field(description="Направление: Покупка/Шорт, LONG/SHORT или BUY/SELL")
+    horizon: str | None = Field(default=None, description="Горизонт: Краткосрочный/Среднесрочный/Долгосрочный")
+    strength: str | None = Field(default=None, description="Сила катализатора или силы валют, если применимо")
+    thesis: str = Field(description="Тезис в 1-2 предложениях")
+
+
+class TickerThesis(BaseModel):
+    ticker: str
+    thesis: str
+
+
+class ThemeAnalysis(BaseModel):
+    title: str = Field(description="Название темы, нарратива или валюты")
+    description: str = Field(description="Краткое описание")
+    tickers: list[TickerThesis]
+
+
+class Stage1Report(BaseModel):
+    key_themes: list[str] = Field(description="3-4 ключевые темы или фактора рынка")
+    top_ideas: list[TradeIdea] = Field(description="Самые сильные торговые идеи")
+    analysis: list[ThemeAnalysis] = Field(description="Анализ и тезисы по темам")
+    stage2_tickers: list[str] = Field(description="Тикеры или пары для технического анализа на втором этапе")
+
+
+class TechnicalRecommendation(BaseModel):
+    ticker: str
+    price: str | None = None
+    ma50: str | None = None
+    ma200: str | None = None
+    rsi: str | None = None
+    recommendation: str = Field(description="Краткая рекомендация с целевой ценой или уровнем стоп-лосса")
+    horizon: str | None = None
+
+
+class Stage2Report(BaseModel):
+    recommendations: list[TechnicalRecommendation]
+
+
+JSON_STAGE1_INSTRUCTION = """<b>ФОРМАТ ВЫХОДА:</b> ответ — один JSON-объект по заданной схеме, без HTML и Markdown.
+key_themes — ключевые темы (факторы рынка); top_ideas — самые сильные торговые идеи; analysis — анализ и тезисы
+по темам (для валютного анализа — по одной записи на валюту с оценкой силы в description); stage2_tickers — тикеры
+или пары для второго, технического, этапа.
+
+"""
+
+JSON_STAGE2_INSTRUCTION = """
+Ответ — только JSON-объект без пояснений и без Markdown, строго такой структуры:
+{"recommendations": [{"ticker": "...", "price": "...", "ma50": "...", "ma200": "...", "rsi": "...",
+"recommendation": "краткая рекомендация с целевой ценой или стоп-лоссом", "horizon": "Краткосрочный/Среднесрочный/Долгосрочный"}]}
+"""
+
+
+class SchemaValidationError(ValueError):
+    """Ответ модели не соответствует ожидаемой схеме."""
+
+
+def json_prompt_template(prompt_template: str) -> str:
+    """
+    Шаблон промпта для режима JSON: HTML-раздел "ФОРМАТ ВЫХОДА" заменяется инструкцией
+    по схеме, строка с плейсхолдером дайджеста сохраняется.
+    """
+    head, found, _ = prompt_template.partition("<b>ФОРМАТ ВЫХОДА")
+    if not found or DIGEST_PLACEHOLDER not in prompt_template:
+        return prompt_template + "\n\n" + JSON_STAGE1_INSTRUCTION
+    placeholder_line_start = prompt_template.rfind("\n", 0, prompt_template.find(DIGEST_PLACEHOLDER)) + 1
+    return head + JSON_STAGE1_INSTRUCTION + prompt_template[placeholder_line_start:]
+
+
+def _extract_json(text: str) -> str:
+    """JSON из ответа без схемы: снимает обрамление ```json ... ``` и текст вокруг объекта."""
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end > start else text
+
+
+def parse_report(text: str, model: type[BaseModel]) -> BaseModel:
+    """Проверяет ответ модели по схеме. Raises: SchemaValidationError."""
+    try:
+        return model.model_validate_json(_extract_json(text or ""))
+    except (ValidationError, json.JSONDecodeError) as e:
+        raise SchemaValidationError(f"Ответ не соответствует схеме {model.__name__}: {e}") from e
+
+
+def _e(value) -> str:
+    return html.escape(str(value)) if value is not None else "—"
+
+
+def render_stage1_analysis(report: Stage1Report) -> str:
+    parts = []
+    for theme in report.analysis:
+        parts.append(f"<p><b>{_e(theme.title)}</b><br><i>{_e(theme.description)}</i></p>")
+        if theme.tickers:
+            items = "".join(f"<li><code>{_e(item.ticker)}</code>: {_e(item.thesis)}</li>" for item in theme.tickers)
+            parts.append(f"<ul>{items}</ul>")
+    return "".join(parts)
+
+
+def render_stage1_html(report: Stage1Report, analysis_title: str = "АНАЛИЗ И ТЕЗИСЫ") -> str:
+    """HTML первого этапа для Telegraph в том же порядке разделов, что и в текстовом режиме."""
+    ideas = []
+    for idea in report.top_ideas:
+        details = [f"<b>Тема:</b> {_e(idea.theme)}", f"<b>Тикер:</b> <code>{_e(idea.ticker)}</code>",
+                   f"<b>Направление:</b> {_e(idea.direction)}"]
+        if idea.horizon:
+            details.append(f"<b>Горизонт:</b> {_e(idea.horizon)}")
+        if idea.strength:
+            details.append(f"<b>Сила:</b> {_e(idea.strength)}")
+        ideas.append(f"<li>{' - '.join(details)}<br><i>Тезис: {_e(idea.thesis)}</i></li>")
+    return (
+        f"<h4>КЛЮЧЕВЫЕ ТЕМЫ:</h4><p><i>{_e(', '.join(report.key_themes))}</i></p>"
+        f"<h4>РЕЗЮМЕ ТОРГОВЫХ ИДЕЙ:</h4><ul>{''.join(ideas)}</ul>"
+        f"<h4>{_e(analysis_title)}:</h4>{render_stage1_analysis(report)}"
+    )
+
+
+def render_stage2_html(report: Stage2Report) -> str:
+    parts = ["<h4>ТЕХНИЧЕСКИЙ АНАЛИЗ И РЕКОМЕНДАЦИИ:</h4>"]
+    for item in report.recommendations:
+        parts.append(
+            f"<h4>Тикер: {_e(item.ticker)}</h4><ul>"
+            f"<li><i>Технические данные:</i> Цена: {_e(item.price)}, MA50: {_e(item.ma50)}, "
+            f"MA200: {_e(item.ma200)}, RSI: {_e(item.rsi)}</li>"
+            f"<li><i>Рекомендация:</i> {_e(item.recommendation)}</li>"
+            f"<li><i>Срок реализации:</i> {_e(item.horizon)}</li></ul>"
+        )
+    return "".join(parts)
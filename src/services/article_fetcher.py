@@ -0,0 +1,194 @@
+import hashlib
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+import requests
+from bs4 import BeautifulSoup
+from src.models import Article
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha TEXT NOT NULL, fetched_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS bodies (sha TEXT PRIMARY KEY, text TEXT NOT NULL);
+"""
+
+
+class ArticleBodyCache:
+    """
+    Кэш извлеченного текста статей на SQLite.
+
+    urls связывает адрес статьи с хэшем содержимого страницы, bodies хранит текст по хэшу:
+    статья, найденная в нескольких темах или запусках, скачивается один раз,
+    а одинаковые страницы под разными адресами разбираются один раз.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_by_url(self, url: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT bodies.text FROM urls JOIN bodies ON bodies.sha = urls.sha "
+                "WHERE urls.url = ? AND urls.fetched_at > ?",
+                (url, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_by_hash(self, sha: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT text FROM bodies WHERE sha = ?", (sha,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, url: str, sha: str, text: str):
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO bodies (sha, text) VALUES (?, ?)", (sha, text))
+            conn.execute("INSERT OR REPLACE INTO urls (url, sha, fetched_at) VALUES (?, ?, ?)",
+                         (url, sha, time.time()))
+
+
+def extract_article_text(html: bytes | str) -> str:
+    """Извлекает основной текст страницы: абзацы из <article> (или всей страницы) без служебных блоков."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "aside", "form"]):
+        tag.decompose()
+    container = soup.find("article") or soup.body or soup
+    paragraphs = (p.get_text(" ", strip=True) for p in container.find_all("p"))
+    # Короткие абзацы — как правило подписи, кнопки и прочий шум
+    return "\n".join(text for text in paragraphs if len(text) >= 40)
+
+
+class ArticleFetcher:
+    """
+    Загружает полные тексты статей через ограниченный пул потоков.
+    Одновременно к одному хосту идет не больше per_host запросов, каждый запрос
+    ограничен таймаутом и размером ответа, извлеченный текст обрезается до max_chars.
+    """
+
+    def __init__(self, cache: ArticleBodyCache, max_workers: int = 8, per_host: int = 2,
+                 timeout: float = 10.0, max_bytes: int = 2_000_000, max_chars: int = 3000):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self._host_limits: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # requests.Session не гарантирует потокобезопасность, поэтому у каждого потока своя
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = "Mozilla/5.0 (compatible; NewsAnalyticBot/1.0)"
+        return session
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _download(self, url: str) -> bytes:
+        with self._host_limit(url):
+            with self._session().get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                chunks, size = [], 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_bytes:
+                        break
+        return b"".join(chunks)[:self.max_bytes]
+
+    def fetch_body(self, url: str) -> str | None:
+        """Возвращает текст статьи (из кэша или загрузив страницу); None при ошибке."""
+        cached = self.cache.get_by_url(url)
+        if cached is not None:
+            return cached
+        try:
+            raw = self._download(url)
+        except requests.RequestException as e:
+            logger.warning("Не удалось загрузить статью %s: %s", url, e)
+            return None
+        sha = hashlib.sha256(raw).hexdigest()
+        text = self.cache.get_by_hash(sha)
+        if text is None:
+            text = extract_article_text(raw)[:self.max_chars]
+        self.cache.put(url, sha, text)
+        return text
+
+    def fetch_bodies(self, urls: Iterable[str]) -> dict[str, str]:
+        """Параллельно загружает тексты для набора адресов; в результат попадают только успешные."""
+        unique_urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="article-fetch") as pool:
+            bodies = dict(zip(unique_urls, pool.map(self.fetch_body, unique_urls)))
+        return {url: body for url, body in bodies.items() if body}
+
+
+def _is_google_news_redirect(url: str) -> bool:
+    # Неразрешенная ссылка ленты Google News ведет на страницу-перенаправление без текста статьи
+    return urlsplit(url).hostname == "news.google.com"
+
+
+def with_full_text(articles: Iterable[Article], fetcher: ArticleFetcher, top_n: int) -> Iterator[Article]:
+    """
+    Этап конвейера: для top_n самых свежих статей (тот же порядок, что у rank_articles) подменяет
+    краткое описание полным текстом. В памяти держатся только кандидаты (не больше top_n):
+    вытесненные из них статьи и неразрешенные ссылки Google News проходят сразу, а сами
+    кандидаты выдаются в конце, от новых к старым.
+    """
+    if top_n <= 0:
+        yield from articles
+        return
+    heap: list[tuple[float, int, Article]] = []
+    redirects = 0
+    for index, article in enumerate(articles):
+        if _is_google_news_redirect(article.url):
+            redirects += 1
+            yield article
+            continue
+        # index разрешает равенство дат и сохраняет порядок поступления
+        item = (article.published or 0.0, -index, article)
+        if len(heap) < top_n:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            yield heapq.heapreplace(heap, item)[2]
+        else:
+            yield article
+    head = [article for _, _, article in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+    if redirects and not head:
+        logger.warning(f"Полные тексты не загружены: все {redirects} статей — неразрешенные ссылки Google News.")
+    started = time.perf_counter()
+    bodies = fetcher.fetch_bodies(article.url for article in head)
+    logger.info(f"Полные тексты: получено {len(bodies)} из {len(head)} за {time.perf_counter() - started:.1f} с "
+                f"(пропущено неразрешенных ссылок Google News: {redirects}).")
+    for article in head:
+        body = bodies.get(article.url)
+        # Полный текст используется, только если он содержательнее описания
+        if body and len(body) > len(article.text):
+            article.text = body
+        yield article
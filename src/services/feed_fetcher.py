@@ -0,0 +1,225 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import IO
+from urllib.parse import urlsplit
+import requests
+from bs4 import BeautifulSoup
+from src.config import CACHE_DIR, FEED_TIMEOUT
+from src.models import parse_published
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    title TEXT,
+    entries TEXT NOT NULL
+);
+"""
+
+# Параллельных HEAD-запросов при разрешении ссылок Google News одной ленты
+LINK_RESOLVE_WORKERS = 8
+
+
+def _local(tag: str) -> str:
+    """Имя тега без пространства имен."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _clean_text(value: str | None) -> str:
+    if not value:
+        return ""
+    if "<" in value:
+        value = BeautifulSoup(value, "html.parser").get_text(" ", strip=True)
+    return value.replace("\xa0", " ").strip()
+
+
+def _parse_date(value: str | None) -> float | None:
+    """Дата из RSS (RFC 2822) или Atom (ISO 8601) во время Unix."""
+    if not value:
+        return None
+    published = parse_published(value)
+    if published is not None:
+        return published
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _entry_from_element(element: ET.Element) -> dict | None:
+    fields = {"title": "", "link": "", "description": "", "published": None, "source": ""}
+    for child in element:
+        name = _local(child.tag)
+        if name == "title":
+            fields["title"] = _clean_text(child.text)
+        elif name == "link":
+            # В Atom адрес лежит в атрибуте href, в RSS — в тексте
+            link = child.get("href") or (child.text or "").strip()
+            if link and (not fields["link"] or child.get("rel", "alternate") == "alternate"):
+                fields["link"] = link
+        elif name in ("description", "summary", "content") and not fields["description"]:
+            fields["description"] = _clean_text(child.text)
+        elif name in ("pubDate", "published", "updated") and fields["published"] is None:
+            fields["published"] = _parse_date(child.text)
+        elif name == "source":
+            fields["source"] = (child.text or "").strip()
+    return fields if fields["link"] else None
+
+
+def parse_feed(stream: IO[bytes]) -> tuple[str, list[dict]]:
+    """
+    Потоково разбирает RSS или Atom ленту через iterparse.
+
+    Каждая запись обрабатывается, как только закрыт ее тег, после чего элемент
+    очищается: дерево всего документа в памяти не строится.
+    Возвращает (название ленты, список записей).
+    """
+    feed_title = ""
+    entries = []
+    depth = 0
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        name = _local(element.tag)
+        if name in ("item", "entry"):
+            entry = _entry_from_element(element)
+            if entry:
+                entries.append(entry)
+            element.clear()
+        elif name == "title" and not feed_title and depth <= 2:
+            # <rss><channel><title> или <feed><title>
+            feed_title = _clean_text(element.text)
+    return feed_title, entries
+
+
+class FeedFetcher:
+    """
+    Загружает ленты условными запросами.
+
+    Для каждого адреса в SQLite хранятся ETag, Last-Modified и уже разобранные записи.
+    Повторный запрос отправляется с If-None-Match / If-Modified-Since; на ответ 304
+    возвращаются сохраненные записи без загрузки и разбора. Если лента недоступна,
+    возвращается последняя сохраненная версия.
+    """
+
+    def __init__(self, path: Path, timeout: float = 15.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _session(self) -> requests.Session:
+        # requests.Session не гарантирует потокобезопасность, поэтому у каждого потока своя
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = "Mozilla/5.0 (compatible; NewsAnalyticBot/1.0)"
+        return session
+
+    def _load(self, url: str) -> sqlite3.Row | None:
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM feeds WHERE url = ?", (url,)).fetchone()
+
+    def _store(self, url: str, etag: str | None, last_modified: str | None, title: str, entries: list[dict]):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO feeds (url, etag, last_modified, fetched_at, title, entries) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, time.time(), title, json.dumps(entries, ensure_ascii=False))
+            )
+
+    def _resolve_link(self, url: str) -> str | None:
+        try:
+            response = self._session().head(url, timeout=self.timeout, allow_redirects=False)
+        except requests.RequestException as e:
+            logger.debug("Не удалось разрешить ссылку %s: %s", url, e)
+            return None
+        return response.headers.get("Location")
+
+    def _resolve_google_links(self, entries: list[dict], previous: list[dict]):
+        """
+        Заменяет ссылки-перенаправления Google News адресами статей (как process_url в GNews).
+        Исходная ссылка сохраняется в feed_link; ссылки, разрешенные в прошлой версии ленты, не запрашиваются снова.
+        """
+        known = {entry["feed_link"]: entry["link"] for entry in previous
+                 if entry.get("feed_link") and entry["link"] != entry["feed_link"]}
+        redirects = [entry for entry in entries if urlsplit(entry["link"]).hostname == "news.google.com"]
+        unknown = list(dict.fromkeys(entry["link"] for entry in redirects if entry["link"] not in known))
+        if unknown:
+            with ThreadPoolExecutor(max_workers=LINK_RESOLVE_WORKERS, thread_name_prefix="feed-links") as pool:
+                known.update((link, resolved) for link, resolved in zip(unknown, pool.map(self._resolve_link, unknown))
+                             if resolved)
+        for entry in redirects:
+            entry["feed_link"] = entry["link"]
+            entry["link"] = known.get(entry["link"], entry["link"])
+
+    def fetch(self, url: str, resolve_links: bool = False) -> tuple[str, list[dict]]:
+        """
+        Возвращает (название ленты, записи); при ошибке без сохраненной версии — ("", []).
+        resolve_links: разрешить ссылки-перенаправления Google News до сохранения (на ответ 304 они уже разрешены).
+        """
+        stored = self._load(url)
+        headers = {}
+        if stored is not None:
+            if stored["etag"]:
+                headers["If-None-Match"] = stored["etag"]
+            if stored["last_modified"]:
+                headers["If-Modified-Since"] = stored["last_modified"]
+
+        try:
+            with self._session().get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304 and stored is not None:
+                    logger.debug(f"Лента не изменилась (304): {url}")
+                    return stored["title"] or "", json.loads(stored["entries"])
+                response.raise_for_status()
+                response.raw.decode_content = True
+                title, entries = parse_feed(response.raw)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except (requests.RequestException, ET.ParseError) as e:
+            logger.warning(f"Не удалось загрузить ленту {url}: {e}")
+            if stored is not None:
+                return stored["title"] or "", json.loads(stored["entries"])
+            return "", []
+
+        if resolve_links:
+            self._resolve_google_links(entries, json.loads(stored["entries"]) if stored is not None else [])
+        self._store(url, etag, last_modified, title, entries)
+        return title, entries
+
+
+_default_fetcher: FeedFetcher | None = None
+
+
+def get_feed_fetcher() -> FeedFetcher:
+    """Загрузчик лент с кэшем в CACHE_DIR, общий для процесса."""
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = FeedFetcher(CACHE_DIR / "feeds.sqlite3", timeout=FEED_TIMEOUT)
+    return _default_fetcher
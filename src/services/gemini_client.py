@@ -1,13 +1,79 @@
+import asyncio
 import re
+import time
 import logging
+from collections.abc import Callable
 import google.genai as genai
 from google.genai.types import Tool, GoogleSearch, GenerateContentConfig
-from google.genai.errors import ServerError
-from src.config import GEMINI_API_KEY
+import httpx
+from google.genai.errors import ServerError, ClientError
+from src.config import (GEMINI_API_KEY, GEMINI_PROMPT_CACHE, GEMINI_PROMPT_CACHE_TTL, GEMINI_MODEL,
+                        GEMINI_HEDGING, GEMINI_FALLBACK_MODEL, GEMINI_HEDGE_PERCENTILE,
+                        GEMINI_HEDGE_DEFAULT_DELAY, GEMINI_HEDGE_MIN_SAMPLES, GEMINI_RETRY_ATTEMPTS,
+                        GEMINI_RETRY_BUDGET_RATIO, GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_RESET_TIMEOUT,
+                        GEMINI_OUTPUT_MODE, TICKER_SNAPSHOT_CACHE)
+from src.prompts import MACRO_PROMPT
+from src.services.prompt_cache import PromptCache, split_prompt_template
+from src.services.hedging import LatencyTracker, HedgeStats, BACKGROUND_LOOP, hedged_call
+from src.services.resilience import RetryBudget, CircuitBreaker
+from src.services.admission import AdmissionTimeout, PRIORITY_MANUAL, estimate_tokens, get_admission_controller
+from src.services.analysis_schema import (Stage1Report, Stage2Report, SchemaValidationError, JSON_STAGE2_INSTRUCTION,
+                                          json_prompt_template, parse_report, render_stage1_html,
+                                          render_stage1_analysis, render_stage2_html)
+from src.services.ticker_snapshots import (get_ticker_snapshot_cache, normalize_ticker, parse_stage2_snapshots,
+                                           snapshots_from_report, format_snapshot)
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 logger = logging.getLogger(__name__)
 
+# Общий для процесса кэш статических инструкций: GeminiClient создается на каждый анализ
+PROMPT_CACHE = PromptCache(ttl_seconds=GEMINI_PROMPT_CACHE_TTL)
+# Общие для процесса замеры задержек (отдельно по видам запросов: задержки 2-го этапа с поиском
+# и короткой сводки макро-фона несравнимы с 1-м этапом) и счетчики хеджирования
+LATENCY_TRACKERS = {kind: LatencyTracker() for kind in ("stage1", "stage2", "macro")}
+HEDGE_STATS = HedgeStats()
+# Общие для всех анализов бюджет повторов и предохранитель: при недоступности Gemini
+# запросы из очереди завершаются сразу, а не тратят минуты на ожидание между попытками
+RETRY_BUDGET = RetryBudget(ratio=GEMINI_RETRY_BUDGET_RATIO)
+CIRCUIT_BREAKER = CircuitBreaker("gemini", failure_threshold=GEMINI_BREAKER_THRESHOLD,
+                                 reset_timeout=GEMINI_BREAKER_RESET_TIMEOUT)
+
+
+class GeminiError(Exception):
+    """Базовая ошибка обращения к Gemini."""
+
+
+class GeminiTransientError(GeminiError):
+    """Временный сбой (5xx, 429, таймаут, обрыв соединения); запрос можно повторить."""
+
+
+class GeminiRequestError(GeminiError):
+    """Запрос отклонен или завершился ошибкой, которую повтор не исправит."""
+
+
+class GeminiUnavailableError(GeminiError):
+    """Gemini признан недоступным (предохранитель открыт); запрос не отправлялся."""
+
+
+def _to_gemini_error(error: Exception) -> GeminiError:
+    """Приводит исключение SDK или транспорта к типизированной ошибке."""
+    is_transient = (
+        isinstance(error, ServerError)
+        or (isinstance(error, ClientError) and error.code == 429)
+        or isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError))
+    )
+    if is_transient:
+        return GeminiTransientError(str(error))
+    return GeminiRequestError(str(error))
+
+
+def _stop_when_retry_budget_exhausted(retry_state) -> bool:
+    """Условие остановки tenacity: повтор разрешен, только если в общем бюджете есть токен."""
+    if RETRY_BUDGET.try_withdraw():
+        return False
+    logger.warning("Бюджет повторных попыток Gemini исчерпан, запрос не будет повторен.")
+    return True
+
 
 class GeminiClient:
     """
@@ -15,11 +81,18 @@ class GeminiClient:
     современный способ подключения инструментов.
     """
 
-    def __init__(self):
-        if not GEMINI_API_KEY:
-            raise ValueError("Ключ GEMINI_API_KEY не найден в переменных окружения.")
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.model_name = 'gemini-2.5-flash'
+    def __init__(self, client=None):
+        """
+        client: готовый клиент с интерфейсом genai.Client (например, локальная
+                заглушка из src/loadtest/fakes.py). По умолчанию создается настоящий.
+        """
+        if client is None:
+            if not GEMINI_API_KEY:
+                raise ValueError("Ключ GEMINI_API_KEY не найден в переменных окружения.")
+            client = genai.Client(api_key=GEMINI_API_KEY)
+        self.client = client
+        self.model_name = GEMINI_MODEL
+        self.fallback_model_name = GEMINI_FALLBACK_MODEL or GEMINI_MODEL
         search_tool = Tool(google_search=GoogleSearch())
         self.generation_config = GenerateContentConfig(
             tools=[search_tool],
@@ -29,36 +102,170 @@ class GeminiClient:
             f"Клиент Gemini инициализирован с моделью '{self.model_name}' и доступом в интернет."
         )
 
+    def _execute_analysis(self, prompt: str, system_instruction: str | None = None,
+                          usage: dict | None = None, priority: int = PRIORITY_MANUAL,
+                          response_schema=None, search: bool = True, kind: str = "stage1") -> str:
+        """
+        Приватный метод для выполнения запроса к Gemini с повторными попытками.
+        system_instruction: статическая часть промпта; передается через кэш или system_instruction.
+        usage: словарь, в который накапливаются счетчики токенов запроса.
+        priority: приоритет допуска к API (PRIORITY_SCHEDULED обслуживается раньше PRIORITY_MANUAL).
+        response_schema: модель pydantic; если задана, ответ запрашивается в JSON по этой схеме (без поиска).
+        search: разрешить модели поиск в интернете (не нужен, если все данные уже есть в промпте).
+        kind: вид запроса ("stage1", "stage2", "macro") — по нему ведутся замеры задержек для хеджирования.
+
+        Raises:
+            GeminiUnavailableError: предохранитель открыт или допуск к API не получен, запрос не отправлялся.
+            GeminiTransientError: временный сбой, повторные попытки исчерпаны.
+            GeminiRequestError: запрос отклонен или завершился иной ошибкой.
+        """
+        RETRY_BUDGET.deposit()
+        return self._execute_with_retries(prompt, system_instruction, usage, priority, response_schema, search, kind)
+
     @retry(
         # Ждем с экспоненциальной задержкой: 1с, 2с, 4с, 8с...
         wait=wait_exponential(multiplier=1, min=1, max=60),
-        # Останавливаемся после 5 попыток
-        stop=stop_after_attempt(5),
-        # Повторяем только при серверных ошибках (503, 500) или таймаутах
-        retry=retry_if_exception_type((ServerError)),
+        # Останавливаемся после GEMINI_RETRY_ATTEMPTS попыток или когда исчерпан общий бюджет повторов
+        stop=stop_after_attempt(GEMINI_RETRY_ATTEMPTS) | _stop_when_retry_budget_exhausted,
+        # Повторяем только временные сбои (5xx, 429, таймауты и обрывы соединения)
+        retry=retry_if_exception_type(GeminiTransientError),
+        # После последней попытки пробрасываем исходное исключение, а не RetryError
+        reraise=True,
         # Логируем каждую попытку
         before_sleep=lambda retry_state: logger.warning(
             f"Получена ошибка от Gemini, повторная попытка #{retry_state.attempt_number} "
             f"через {int(retry_state.next_action.sleep)} секунд..."
         )
     )
+    def _execute_with_retries(self, prompt: str, system_instruction: str | None, usage: dict | None,
+                              priority: int, response_schema=None, search: bool = True,
+                              kind: str = "stage1") -> str:
+        if not CIRCUIT_BREAKER.allow_request():
+            raise GeminiUnavailableError(
+                f"Gemini временно недоступен (предохранитель открыт, повтор через "
+                f"{CIRCUIT_BREAKER.retry_after():.0f} с)."
+            )
+
+        # Каждая попытка, включая повторные, проходит общий допуск по лимитам RPM/TPM
+        admission = get_admission_controller()
+        estimated_tokens = estimate_tokens(prompt, system_instruction)
+        try:
+            waited = admission.acquire(estimated_tokens, priority)
+        except AdmissionTimeout as e:
+            # Запрос не отправлен: пробный вызов полуоткрытого предохранителя достанется следующему
+            CIRCUIT_BREAKER.release_probe()
+            raise GeminiUnavailableError(str(e)) from e
+        if waited >= 1:
+            logger.info(f"Запрос к Gemini ждал допуска {waited:.1f} с (приоритет {priority}).")
 
-    def _execute_analysis(self, prompt: str) -> str:
-        """Приватный метод для выполнения запроса к Gemini."""
         logger.info("Отправка запроса в Gemini... (Это может занять некоторое время)")
         try:
+            response = self._generate(prompt, system_instruction, response_schema, search, kind)
+        except Exception as e:
+            # Неудачный запрос не расходует токены: оценка возвращается в корзину TPM
+            admission.settle(estimated_tokens, 0)
+            error = _to_gemini_error(e)
+            if isinstance(error, GeminiTransientError):
+                CIRCUIT_BREAKER.record_failure()
+            else:
+                # Сервис ответил, хоть и ошибкой — это не признак его недоступности
+                CIRCUIT_BREAKER.record_success()
+            logger.error(f"Ошибка при обращении к Gemini API: {e}")
+            raise error from e
+
+        CIRCUIT_BREAKER.record_success()
+        logger.info("Ответ от Gemini получен.")
+        metadata = getattr(response, "usage_metadata", None)
+        admission.settle(estimated_tokens, getattr(metadata, "total_token_count", None))
+        self._record_usage(response, usage)
+        return response.text or ""
+
+    def _generate(self, prompt: str, system_instruction: str | None, response_schema=None, search: bool = True,
+                  kind: str = "stage1"):
+        """Отправляет запрос; в режиме хеджирования при медленном ответе дублирует его."""
+        tracker = LATENCY_TRACKERS[kind]
+        if not GEMINI_HEDGING:
+            started = time.monotonic()
             response = self.client.models.generate_content(
                 model=self.model_name,
                 contents=prompt,
-                config=self.generation_config
+                config=self._build_config(system_instruction, self.model_name, response_schema, search)
             )
+            tracker.record(time.monotonic() - started)
+            return response
 
-            logger.info("Ответ от Gemini получен.")
-            return response.text or ""
-        except Exception as e:
-            error_message = f"[Ошибка при обращении к Gemini API: {e}]"
-            logger.error(error_message, exc_info=True)
-            return error_message
+        # Конфигурация основного запроса (и кэш промпта) готовится здесь, а не в фоновом цикле событий
+        primary_config = self._build_config(system_instruction, self.model_name, response_schema, search)
+
+        def primary():
+            return self.client.aio.models.generate_content(model=self.model_name, contents=prompt,
+                                                           config=primary_config)
+
+        async def hedge():
+            # Конфигурация резервной модели (и ее кэш промпта) создается, только если дубль действительно
+            # отправляется; синхронные вызовы API кэша выполняются вне цикла событий
+            config = await asyncio.get_running_loop().run_in_executor(
+                None, self._build_config, system_instruction, self.fallback_model_name, response_schema, search
+            )
+            return await self.client.aio.models.generate_content(model=self.fallback_model_name, contents=prompt,
+                                                                 config=config)
+
+        # Дубль тоже расходует квоту RPM/TPM; если свободного допуска нет сразу, запрос не дублируется
+        hedge_tokens = estimate_tokens(prompt, system_instruction)
+        return BACKGROUND_LOOP.run(hedged_call(
+            primary, hedge,
+            delay=self._hedge_delay(tracker), tracker=tracker, stats=HEDGE_STATS,
+            admit_hedge=lambda: get_admission_controller().try_acquire(hedge_tokens)
+        ))
+
+    @staticmethod
+    def _hedge_delay(tracker: LatencyTracker) -> float | None:
+        """
+        Порог хеджирования: заданный перцентиль задержек этого вида запросов, а пока замеров меньше
+        GEMINI_HEDGE_MIN_SAMPLES — GEMINI_HEDGE_DEFAULT_DELAY. None (при GEMINI_HEDGE_MIN_SAMPLES=0 и
+        пустом окне замеров) — запрос не дублируется.
+        """
+        if len(tracker) < GEMINI_HEDGE_MIN_SAMPLES:
+            return GEMINI_HEDGE_DEFAULT_DELAY
+        return tracker.percentile(GEMINI_HEDGE_PERCENTILE)
+
+    def _build_config(self, system_instruction: str | None, model: str,
+                      response_schema=None, search: bool = True) -> GenerateContentConfig:
+        """
+        Собирает конфигурацию запроса с учетом режима кэширования статической инструкции.
+        Ответ по схеме (response_schema) запрашивается без поиска: модели 2.5 не совмещают их в одном запросе.
+        """
+        if not system_instruction and not response_schema and search:
+            return self.generation_config
+        tools = self.generation_config.tools if search and not response_schema else None
+        output = {"response_mime_type": "application/json", "response_schema": response_schema} if response_schema else {}
+        if system_instruction and GEMINI_PROMPT_CACHE == "explicit":
+            # Кэш привязан к модели, поэтому для резервной модели создается свой
+            cache_name = PROMPT_CACHE.get_cache_name(self.client, model, system_instruction, tools=tools)
+            if cache_name:
+                # Инструменты уже сохранены в кэше, повторно передавать их нельзя
+                return GenerateContentConfig(
+                    cached_content=cache_name,
+                    temperature=self.generation_config.temperature,
+                    **output
+                )
+        return GenerateContentConfig(
+            system_instruction=system_instruction,
+            tools=tools,
+            temperature=self.generation_config.temperature,
+            **output
+        )
+
+    @staticmethod
+    def _record_usage(response, usage: dict | None):
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is None:
+            return
+        cached_tokens = metadata.cached_content_token_count or 0
+        PROMPT_CACHE.record_usage(cached_tokens)
+        if usage is not None:
+            usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (metadata.prompt_token_count or 0)
+            usage["cached_tokens"] = usage.get("cached_tokens", 0) + cached_tokens
 
     def _parse_stage1_tickers(self, analysis_text: str, parsing_keys: dict) -> list[str]:
         # Используем ключ из конфига, с запасным вариантом по умолчанию
@@ -95,8 +302,21 @@ class GeminiClient:
             logger.warning(f"Не удалось найти или корректно распарсить блок '{analysis_key}'.")
             return None
 
-    def _construct_stage2_prompt(self, tickers: list[str], analysis_block: str) -> str:
-        """Создает промпт для второго, технического, этапа анализа."""
+    def _construct_stage2_prompt(self, tickers: list[str], analysis_block: str, json_output: bool = False,
+                                 cached: dict[str, dict] | None = None) -> str:
+        """
+        Создает промпт для второго, технического, этапа анализа.
+        cached: свежие технические данные из кэша; по этим тикерам модель не ищет данные заново.
+        """
+        cached = cached or {}
+        missing = [ticker for ticker in tickers if normalize_ticker(ticker) not in cached]
+        if not cached:
+            data_step = "1.  **Найди актуальные технические данные:** Используя поиск в интернете, найди:"
+        elif missing:
+            data_step = (f"1.  **Найди актуальные технические данные** только для {', '.join(missing)} "
+                         f"(для остальных тикеров используй данные из списка выше, не ищи их). Используя поиск в интернете, найди:")
+        else:
+            data_step = "1.  **Используй технические данные из списка выше** (поиск не нужен):"
         prompt_parts = [
             "Ты — продвинутый технический аналитик. Твоя задача - дополнить существующий фундаментальный анализ техническими данными.",
             "Вот первоначальный анализ, основанный на новостях:",
@@ -105,9 +325,12 @@ class GeminiClient:
             "--- КОНЕЦ ИСХОДНОГО АНАЛИЗА ---",
             f"\nТеперь, для следующих тикеров, которые были отобраны для второго этапа ({', '.join(tickers)}), выполни технический анализ."
         ]
-        task_prompt = """
+        if cached:
+            prompt_parts.append("Уже известные актуальные технические данные (используй их как есть):")
+            prompt_parts.extend(f"- {format_snapshot(snapshot)}" for snapshot in cached.values())
+        task_prompt = f"""
                                 Для каждого тикера из списка:
-                                1.  **Найди актуальные технические данные:** Используя поиск в интернете, найди:
+                                {data_step}
                                     *   Текущая цена закрытия (Current Closing Price)
                                     *   50-дневная скользящая средняя (MA50)
                                     *   200-дневная скользящая средняя (MA200)
@@ -128,17 +351,85 @@ class GeminiClient:
                                 <h4>Тикер: [Тикер 2]</h4>
                                 ... и так далее.
                                 """
+        if json_output:
+            # Поиск и схема ответа несовместимы, поэтому JSON запрашивается текстом и проверяется после
+            task_prompt = task_prompt.split("<b>ФОРМАТ ВЫХОДА")[0] + JSON_STAGE2_INSTRUCTION
         prompt_parts.append(task_prompt)
         return "\n".join(prompt_parts)
 
 
-    def run_two_stage_analysis(self, digest: str, prompt_template: str, parsing_keys: dict) -> dict[str, str]:
-        logger.info("--- Запуск 1-го этапа анализа (фундаментальный) ---")
-        stage1_prompt = prompt_template.replace("[Вставь полный дайджест новостей]", digest)
-        analysis_part_1 = self._execute_analysis(stage1_prompt)
+    def _stage1_request(self, prompt_template: str, digest: str) -> tuple[str | None, str]:
+        """Возвращает (статическая инструкция, запрос) для 1-го этапа с учетом режима кэширования."""
+        if GEMINI_PROMPT_CACHE == "off":
+            return None, prompt_template.replace("[Вставь полный дайджест новостей]", digest)
+        # Статическая инструкция уходит в кэш, в запросе остается только дайджест
+        system_instruction, lead, tail = split_prompt_template(prompt_template)
+        return system_instruction, f"{lead}{digest}{tail}"
+
+    @staticmethod
+    def _log_prompt_cache_usage(usage: dict):
+        if usage.get("cached_tokens"):
+            logger.info(f"Кэш промпта: {usage['cached_tokens']} из {usage.get('prompt_tokens', 0)} входных токенов "
+                        f"1-го этапа взяты из кэша (всего сэкономлено за процесс: {PROMPT_CACHE.tokens_saved}).")
+
+    @staticmethod
+    def _cached_snapshots(tickers: list[str]) -> dict[str, dict]:
+        """Свежие технические данные по тикерам из общего кэша; сбой кэша не прерывает анализ."""
+        if not TICKER_SNAPSHOT_CACHE:
+            return {}
+        try:
+            cached = get_ticker_snapshot_cache().get_fresh(tickers)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш технических данных: {e}")
+            return {}
+        if cached:
+            logger.info(f"Технические данные из кэша: {len(cached)} из {len({normalize_ticker(t) for t in tickers})} "
+                        f"тикеров ({', '.join(sorted(cached))}).")
+        return cached
+
+    @staticmethod
+    def _store_snapshots(snapshots: list[dict], cached: dict[str, dict]):
+        """Сохраняет полученные моделью данные; подставленные из кэша не обновляются, чтобы не продлевать их срок."""
+        if not TICKER_SNAPSHOT_CACHE:
+            return
+        fetched = [snapshot for snapshot in snapshots if snapshot["ticker"] not in cached]
+        try:
+            get_ticker_snapshot_cache().put(fetched)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить технические данные в кэш: {e}")
 
-        if "[Ошибка" in analysis_part_1:
-            return {"stage1": analysis_part_1, "stage2": ""}
+    def run_macro_summary(self, digest: str, priority: int = PRIORITY_MANUAL, usage: dict | None = None) -> str:
+        """Сводка макроэкономического фона по новостям, общая для всех типов анализа (без поиска)."""
+        logger.info("--- Запуск общего этапа: сводка макроэкономического фона ---")
+        return self._execute_analysis(MACRO_PROMPT.format(digest=digest), usage=usage, priority=priority,
+                                      search=False, kind="macro")
+
+    @staticmethod
+    def _notify_stage1(on_stage1: Callable[[dict], None] | None, result: dict):
+        """Передает результат 1-го этапа до запуска 2-го; ошибка получателя не прерывает анализ."""
+        if on_stage1 is None:
+            return
+        try:
+            on_stage1(result)
+        except Exception as e:
+            logger.error(f"Ошибка обработки результата 1-го этапа: {e}", exc_info=True)
+
+    def run_two_stage_analysis(self, digest: str, prompt_template: str, parsing_keys: dict,
+                               priority: int = PRIORITY_MANUAL,
+                               on_stage1: Callable[[dict], None] | None = None) -> dict:
+        """
+        on_stage1: вызывается с результатом 1-го этапа (stage1, tickers, analysis_block) перед
+        запуском 2-го — например, чтобы опубликовать отчет, не дожидаясь технического анализа.
+        """
+        if GEMINI_OUTPUT_MODE == "json":
+            return self._run_two_stage_json(digest, prompt_template, parsing_keys, priority, on_stage1)
+
+        logger.info("--- Запуск 1-го этапа анализа (фундаментальный) ---")
+        usage = {}
+        system_instruction, stage1_prompt = self._stage1_request(prompt_template, digest)
+        # Ошибка 1-го этапа (GeminiError) пробрасывается вызывающему коду
+        analysis_part_1 = self._execute_analysis(stage1_prompt, system_instruction, usage, priority)
+        self._log_prompt_cache_usage(usage)
 
         # Передаем ключи в парсеры
         tickers = self._parse_stage1_tickers(analysis_part_1, parsing_keys)
@@ -146,10 +437,76 @@ class GeminiClient:
 
         if not tickers or not analysis_block:
             logger.warning("Не удалось извлечь данные для 2-го этапа. Возвращаю только 1-й этап.")
-            return {"stage1": analysis_part_1, "stage2": ""}
+            return {"stage1": analysis_part_1, "stage2": "", "usage": usage,
+                    "tickers": tickers, "analysis_block": analysis_block}
 
+        self._notify_stage1(on_stage1, {"stage1": analysis_part_1, "tickers": tickers,
+                                        "analysis_block": analysis_block})
         logger.info("--- Запуск 2-го этапа анализа (технический) ---")
-        stage2_prompt = self._construct_stage2_prompt(tickers, analysis_block)
-        analysis_part_2 = self._execute_analysis(stage2_prompt)
+        cached = self._cached_snapshots(tickers)
+        # Если данные всех тикеров есть в кэше, 2-й этап выполняется без поиска
+        search = any(normalize_ticker(ticker) not in cached for ticker in tickers)
+        stage2_prompt = self._construct_stage2_prompt(tickers, analysis_block, cached=cached)
+        try:
+            analysis_part_2 = self._execute_analysis(stage2_prompt, usage=usage, priority=priority, search=search,
+                                                     kind="stage2")
+        except GeminiError as e:
+            logger.error(f"2-й этап анализа не выполнен: {e}")
+            return {"stage1": analysis_part_1, "stage2": "", "stage2_error": str(e), "usage": usage,
+                    "tickers": tickers, "analysis_block": analysis_block}
+
+        self._store_snapshots(parse_stage2_snapshots(analysis_part_2), cached)
+        return {"stage1": analysis_part_1, "stage2": analysis_part_2, "usage": usage,
+                "tickers": tickers, "analysis_block": analysis_block}
+
+    def _run_two_stage_json(self, digest: str, prompt_template: str, parsing_keys: dict, priority: int,
+                            on_stage1: Callable[[dict], None] | None = None) -> dict:
+        """
+        Двухэтапный анализ с ответами в JSON: 1-й этап — по схеме Stage1Report (response_schema),
+        2-й этап — JSON по описанию в промпте с проверкой по Stage2Report (ему нужен поиск).
+        HTML для Telegraph собирается локально из проверенных данных.
+        """
+        logger.info("--- Запуск 1-го этапа анализа (фундаментальный, JSON) ---")
+        usage = {}
+        system_instruction, stage1_prompt = self._stage1_request(json_prompt_template(prompt_template), digest)
+        stage1_text = self._execute_analysis(stage1_prompt, system_instruction, usage, priority,
+                                             response_schema=Stage1Report)
+        self._log_prompt_cache_usage(usage)
+        try:
+            report = parse_report(stage1_text, Stage1Report)
+        except SchemaValidationError as e:
+            raise GeminiRequestError(str(e)) from e
+
+        analysis_block = render_stage1_analysis(report)
+        result = {
+            "stage1": render_stage1_html(report, parsing_keys.get("analysis_section", "АНАЛИЗ И ТЕЗИСЫ")),
+            "stage2": "",
+            "usage": usage,
+            "tickers": report.stage2_tickers,
+            "analysis_block": analysis_block,
+            "structured": {"stage1": report.model_dump()},
+        }
+        if not report.stage2_tickers:
+            logger.warning("1-й этап не вернул тикеров для 2-го этапа. Возвращаю только 1-й этап.")
+            return result
+
+        self._notify_stage1(on_stage1, result)
+        logger.info(f"--- Запуск 2-го этапа анализа (технический, JSON), тикеры: {report.stage2_tickers} ---")
+        cached = self._cached_snapshots(report.stage2_tickers)
+        search = any(normalize_ticker(ticker) not in cached for ticker in report.stage2_tickers)
+        stage2_prompt = self._construct_stage2_prompt(report.stage2_tickers, analysis_block, json_output=True,
+                                                      cached=cached)
+        try:
+            # Без поиска 2-й этап, как и 1-й, может отвечать по схеме
+            stage2_text = self._execute_analysis(stage2_prompt, usage=usage, priority=priority, search=search,
+                                                 response_schema=None if search else Stage2Report, kind="stage2")
+            stage2_report = parse_report(stage2_text, Stage2Report)
+        except (GeminiError, SchemaValidationError) as e:
+            logger.error(f"2-й этап анализа не выполнен: {e}")
+            result["stage2_error"] = str(e)
+            return result
 
-        return {"stage1": analysis_part_1, "stage2": analysis_part_2}
\ No newline at end of file
+        self._store_snapshots(snapshots_from_report(stage2_report), cached)
+        result["stage2"] = render_stage2_html(stage2_report)
+        result["structured"]["stage2"] = stage2_report.model_dump()
+        return result
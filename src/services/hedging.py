@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Скользящее окно наблюдаемых задержек запросов для вычисления порога хеджирования."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> float | None:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round((len(ordered) - 1) * pct / 100)))
+        return ordered[index]
+
+
+class HedgeStats:
+    """Счетчики хеджирования: сколько запросов отправлено, сколько продублировано и кто победил (или оба упали)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.both_failed = 0
+        self._lock = threading.Lock()
+
+    def record(self, hedged: bool, hedge_won: bool, failed: bool = False):
+        with self._lock:
+            self.requests += 1
+            if hedged:
+                self.hedged += 1
+                if failed:
+                    self.both_failed += 1
+                elif hedge_won:
+                    self.hedge_wins += 1
+                else:
+                    self.primary_wins += 1
+
+    def summary(self) -> str:
+        with self._lock:
+            rate = self.hedged / self.requests * 100 if self.requests else 0.0
+            return (f"запросов: {self.requests}, продублировано: {self.hedged} ({rate:.1f}%), "
+                    f"побед дубля: {self.hedge_wins}, побед основного: {self.primary_wins}, "
+                    f"оба с ошибкой: {self.both_failed}")
+
+
+class _BackgroundLoop:
+    """
+    Один фоновый цикл asyncio на процесс. Асинхронный клиент genai привязывает
+    соединения к циклу событий, поэтому все хеджированные запросы выполняются в нем.
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def run(self, coro, timeout: float | None = None):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="gemini-hedging-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+
+BACKGROUND_LOOP = _BackgroundLoop()
+
+
+async def hedged_call(primary_factory, hedge_factory, delay: float | None, tracker: LatencyTracker,
+                      stats: HedgeStats, admit_hedge: Callable[[], bool] | None = None):
+    """
+    Запускает основной запрос; если он не завершился за delay секунд, запускает дубль.
+    Возвращает результат первого успешно завершившегося запроса, второй отменяется.
+    Если оба запроса упали, пробрасывает исключение основного. delay=None — без дубля.
+
+    primary_factory/hedge_factory — функции без аргументов, возвращающие корутину запроса.
+    admit_hedge — допуск дубля по лимитам API; если он вернул False, дубль не отправляется.
+    """
+    started = time.monotonic()
+    primary = asyncio.ensure_future(primary_factory())
+    if delay is None:
+        stats.record(hedged=False, hedge_won=False)
+        result = await primary
+        tracker.record(time.monotonic() - started)
+        return result
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done and not primary.exception():
+        tracker.record(time.monotonic() - started)
+        stats.record(hedged=False, hedge_won=False)
+        return primary.result()
+    if done:
+        # Основной запрос упал быстрее порога — дублировать нечего, ошибку обработает политика повторов
+        stats.record(hedged=False, hedge_won=False)
+        return primary.result()
+
+    if admit_hedge is not None and not admit_hedge():
+        logger.info(f"Запрос к Gemini не завершился за {delay:.1f} с, но лимит запросов не позволяет дублировать его.")
+        stats.record(hedged=False, hedge_won=False)
+        result = await primary
+        tracker.record(time.monotonic() - started)
+        return result
+
+    logger.info(f"Запрос к Gemini не завершился за {delay:.1f} с, отправляю дублирующий запрос.")
+    hedge = asyncio.ensure_future(hedge_factory())
+    pending = {primary, hedge}
+    first_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    if task is primary:
+                        tracker.record(time.monotonic() - started)
+                    first_error = first_error or task.exception()
+                    continue
+                hedge_won = task is hedge
+                # Если победил дубль, основной запрос отменяется: его задержка не меньше прошедшего времени
+                tracker.record(time.monotonic() - started)
+                stats.record(hedged=True, hedge_won=hedge_won)
+                logger.info(f"Хеджирование Gemini: победил {'дубль' if hedge_won else 'основной запрос'} "
+                            f"({stats.summary()}).")
+                return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    stats.record(hedged=True, hedge_won=False, failed=True)
+    raise primary.exception() or first_error
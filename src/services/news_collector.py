@@ -1,63 +1,146 @@
+import contextvars
+import heapq
 import logging
-from gnews import GNews
+import queue
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from src.config import NEWS_PERIOD, NEWS_SOURCE_DEADLINES, NEWSAPI_KEY
+from src.models import Article
+from src.services.news_sources.base import NewsProvider
 
-logging.getLogger('gnews').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# ИЗМЕНЕНИЕ: Функция теперь принимает список тем для поиска
-def gather_strategic_news(topics: list[str]) -> list[dict]:
+# Значение по умолчанию для источников, не указанных в NEWS_SOURCE_DEADLINES
+DEFAULT_SOURCE_DEADLINE = 90.0
+
+_DONE = object()
+
+
+def _source_names(analysis_config: dict) -> list[str]:
+    """Список источников из конфигурации топика ("news_sources" или устаревший "news_source")."""
+    sources = analysis_config.get("news_sources") or analysis_config.get("news_source") or "google"
+    return [sources] if isinstance(sources, str) else list(sources)
+
+
+def build_providers(analysis_config: dict, gnews_instance=None) -> list[NewsProvider]:
     """
-    Собирает новости по списку тем, используя только заголовки и описания из GNews.
+    Создает провайдеров для источников топика.
+    gnews_instance: готовый объект с интерфейсом GNews (например, локальная заглушка).
     """
-    logger.info("Инициализация GNews...")
-    gnews_instance = GNews(language='en', country='US', period='24h')
+    period = analysis_config.get("news_period", NEWS_PERIOD)
+    providers = []
+    for name in _source_names(analysis_config):
+        if name == "google":
+            from src.services.news_sources.gnews_provider import GNewsProvider
+            providers.append(GNewsProvider(period=period, gnews_instance=gnews_instance))
+        elif name == "newsapi":
+            from src.services.news_sources.newsapi_provider import NewsApiProvider
+            providers.append(NewsApiProvider(api_key=NEWSAPI_KEY, period=period))
+        elif name == "rss":
+            from src.services.news_sources.rss_provider import RssProvider
+            providers.append(RssProvider(feeds=analysis_config.get("rss_feeds", {}), period=period))
+        else:
+            logger.error(f"Неизвестный источник новостей: '{name}'")
+    return providers
 
-    all_articles = []
-    seen_urls = set()
 
-    logger.info(f"Начинаю сбор новостей по {len(topics)} темам (только заголовки и описания)...")
+def fan_out_news(providers: list[NewsProvider], topics: list[str],
+                 deadlines: dict[str, float] | None = None) -> Iterator[Article]:
+    """
+    Опрашивает всех провайдеров параллельно и выдает статьи по мере поступления.
 
-    for topic in topics:
-        logger.info(f"  -> Запрашиваю тему: {topic}")
-        try:
-            news_by_topic = gnews_instance.get_news_by_topic(topic)
-            if not news_by_topic:
-                logger.info(f"     (не найдено новостей по теме {topic})")
+    У каждого источника свой срок (в секундах от начала сбора). Когда срок истек,
+    статьи источника больше не принимаются, и сбор завершается, как только закончили
+    или вышли за срок все источники, не дожидаясь самого медленного.
+    """
+    deadlines = deadlines or {}
+    items = queue.Queue(maxsize=1000)
+    stop = threading.Event()
+    started = time.monotonic()
+    running = {provider.name: started + deadlines.get(provider.name, DEFAULT_SOURCE_DEADLINE)
+               for provider in providers}
+    counts = dict.fromkeys(running, 0)
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
                 continue
+        return False
 
-            added_count = 0
-            for article_summary in news_by_topic:
-                url = article_summary['url']
-                if url not in seen_urls and article_summary.get('description'):
-                    all_articles.append({
-                        'title': article_summary['title'],
-                        'text': article_summary['description'],
-                        'url': url,
-                        'publisher': article_summary['publisher']['title']
-                    })
-                    seen_urls.add(url)
-                    added_count += 1
-            if added_count > 0:
-                logger.info(f"     + Добавлено {added_count} уникальных статей.")
+    def produce(provider: NewsProvider):
+        try:
+            for article in provider.iter_articles(topics, should_stop=stop.is_set):
+                if not put((provider.name, article)):
+                    return
         except Exception as e:
-            logger.error(f"Ошибка при сборе новостей по теме '{topic}': {e}")
+            logger.error(f"Ошибка источника '{provider.name}': {e}", exc_info=True)
+        finally:
+            put((provider.name, _DONE))
+
+    for provider in providers:
+        # Каждый поток получает копию контекста, чтобы записи лога сохраняли analysis_type и run_id
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(produce, provider), name=f"news-{provider.name}",
+                         daemon=True).start()
+
+    try:
+        while running:
+            now = time.monotonic()
+            for name in [name for name, deadline in running.items() if deadline <= now]:
+                logger.warning(f"Источник '{name}' не уложился в срок, используются {counts[name]} полученных статей.")
+                del running[name]
+            if not running:
+                break
+            try:
+                name, item = items.get(timeout=min(running.values()) - now)
+            except queue.Empty:
+                continue
+            if name not in running:
+                continue
+            if item is _DONE:
+                logger.info("Источник '%s' завершен за %.1f с: %d статей.", name, time.monotonic() - started, counts[name])
+                del running[name]
+                continue
+            counts[name] += 1
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_topic_news(analysis_config: dict, gnews_instance=None) -> Iterator[Article]:
+    """Потоково выдает статьи по темам топика из всех его источников."""
+    topics = analysis_config.get("news_topics", [])
+    providers = build_providers(analysis_config, gnews_instance)
+    logger.info(f"Начинаю сбор новостей по {len(topics)} темам из источников: "
+                f"{', '.join(provider.name for provider in providers)}...")
+    return fan_out_news(providers, topics, NEWS_SOURCE_DEADLINES)
+
+
+def dedupe_articles(articles: Iterable[Article]) -> Iterator[Article]:
+    """Пропускает только первую статью с каждым URL."""
+    seen_urls = set()
+    for article in articles:
+        if article.url not in seen_urls:
+            seen_urls.add(article.url)
+            yield article
 
-    logger.info(f"Сбор завершен. Всего собрано {len(all_articles)} уникальных новостей.")
-    return all_articles
 
-def prepare_digest_for_ai(articles: list) -> str:
+def rank_articles(articles: Iterable[Article], limit: int) -> Iterator[Article]:
     """
-    Формирует из списка статей единый текстовый дайджест для отправки в AI.
+    Оставляет limit самых свежих статей, от новых к старым.
+    В памяти одновременно держится не больше limit статей.
     """
-    if not articles:
-        return "Нет новостей для анализа."
-
-    digest_parts = ["Вот дайджест свежих новостей для анализа:\n"]
-    for i, article in enumerate(articles):
-        digest_parts.append(f"\n--- Статья #{i + 1} ---\n")
-        digest_parts.append(f"Источник: {article['publisher']}\n")
-        digest_parts.append(f"Заголовок: {article['title']}\n")
-        digest_parts.append("ТЕКСТ (краткое описание):\n")
-        digest_parts.append(article['text'])
-
-    return "".join(digest_parts)
\ No newline at end of file
+    heap: list[tuple[float, int, Article]] = []
+    for index, article in enumerate(articles):
+        # index разрешает равенство дат и сохраняет порядок поступления
+        item = (article.published or 0.0, -index, article)
+        if len(heap) < limit:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+    for _, _, article in sorted(heap, key=lambda entry: entry[:2], reverse=True):
+        yield article
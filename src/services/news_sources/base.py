@@ -0,0 +1,36 @@
+import re
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from src.models import Article
+
+_PERIOD_UNITS = {"h": 3600, "d": 86400, "m": 30 * 86400, "y": 365 * 86400}
+
+
+def period_to_seconds(period: str) -> float:
+    """Переводит период в формате GNews ('12h', '7d', '1m', '1y') в секунды."""
+    match = re.fullmatch(r"(\d+)([hdmy])", period.strip().lower())
+    if not match:
+        raise ValueError(f"Неизвестный формат периода: '{period}'")
+    return int(match.group(1)) * _PERIOD_UNITS[match.group(2)]
+
+
+class NewsProvider(ABC):
+    """
+    Источник новостей. Реализация выдает статьи по списку тем за период
+    и должна прекращать работу между запросами, если should_stop() вернул True.
+    """
+
+    name: str = "base"
+
+    def __init__(self, period: str = "12h"):
+        self.period = period
+
+    @property
+    def since(self) -> float:
+        """Начало окна выдачи (время Unix)."""
+        return time.time() - period_to_seconds(self.period)
+
+    @abstractmethod
+    def iter_articles(self, topics: list[str], should_stop=lambda: False) -> Iterator[Article]:
+        ...
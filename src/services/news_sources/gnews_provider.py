@@ -0,0 +1,91 @@
+import logging
+from collections.abc import Iterator
+from urllib.parse import quote
+from gnews.utils.constants import BASE_URL, SECTIONS, TOPICS
+from src.config import GNEWS_SEARCH_FALLBACK
+from src.models import Article
+from src.services.news_sources.base import NewsProvider
+
+logger = logging.getLogger(__name__)
+
+
+def google_news_feed_url(topic: str, period: str, language: str = "en", country: str = "US",
+                         search_fallback: bool = False) -> str | None:
+    """
+    Адрес RSS Google News для темы: стандартные темы и разделы — их ленты (как GNews.get_news_by_topic).
+    Для остальных тем — None, а при search_fallback — поиск по названию темы за период.
+    """
+    locale = f"hl={language}&gl={country}&ceid={country}:{language}"
+    topic_upper = topic.upper()
+    if topic_upper in TOPICS:
+        return f"{BASE_URL}/headlines/section/topic/{topic_upper}?{locale}"
+    if topic_upper in SECTIONS:
+        return f"{BASE_URL}/topics/{SECTIONS[topic_upper]}?{locale}"
+    if not search_fallback:
+        return None
+    return f"{BASE_URL}/search?q={quote(f'{topic.lower()} when:{period}')}&{locale}"
+
+
+class GNewsProvider(NewsProvider):
+    """
+    Google News: ленты тем загружаются условными запросами через FeedFetcher.
+    Если передан gnews_instance, используется его интерфейс GNews.
+    """
+
+    name = "google"
+
+    def __init__(self, period: str = "12h", gnews_instance=None, fetcher=None):
+        """gnews_instance: готовый объект с интерфейсом GNews (например, локальная заглушка)."""
+        super().__init__(period)
+        self.gnews_instance = gnews_instance
+        self.fetcher = fetcher
+
+    def _iter_gnews(self, topics: list[str], should_stop) -> Iterator[Article]:
+        for topic in topics:
+            if should_stop():
+                return
+            logger.debug("  -> [google] Запрашиваю тему: %s", topic)
+            try:
+                news_by_topic = self.gnews_instance.get_news_by_topic(topic)
+            except Exception as e:
+                logger.error(f"Ошибка при сборе новостей по теме '{topic}': {e}")
+                continue
+            if not news_by_topic:
+                logger.info("     (не найдено новостей по теме %s)", topic, extra={"sample_every": 10})
+                continue
+
+            for article_summary in news_by_topic:
+                if article_summary.get('description'):
+                    yield Article.from_gnews(article_summary, topic=topic)
+
+    def iter_articles(self, topics: list[str], should_stop=lambda: False) -> Iterator[Article]:
+        if self.gnews_instance is not None:
+            yield from self._iter_gnews(topics, should_stop)
+            return
+
+        if self.fetcher is None:
+            from src.services.feed_fetcher import get_feed_fetcher
+            self.fetcher = get_feed_fetcher()
+        for topic in topics:
+            if should_stop():
+                return
+            feed_url = google_news_feed_url(topic, self.period, search_fallback=GNEWS_SEARCH_FALLBACK)
+            if feed_url is None:
+                logger.debug("  -> [google] Тема %s не является темой или разделом Google News, пропускаю", topic)
+                continue
+            logger.debug("  -> [google] Запрашиваю тему: %s", topic)
+            # Ссылки разрешаются при загрузке ленты: полные тексты статей загружаются по адресам издателей
+            _, entries = self.fetcher.fetch(feed_url, resolve_links=True)
+            if not entries:
+                logger.info("     (не найдено новостей по теме %s)", topic, extra={"sample_every": 10})
+                continue
+            for entry in entries:
+                if entry["description"]:
+                    yield Article(
+                        title=entry["title"] or "Без заголовка",
+                        text=entry["description"],
+                        url=entry["link"],
+                        publisher=entry["source"] or "N/A",
+                        published=entry["published"],
+                        topic=topic,
+                    )
@@ -0,0 +1,56 @@
+import logging
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from newsapi import NewsApiClient
+from src.models import Article
+from src.services.news_sources.base import NewsProvider
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_iso(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class NewsApiProvider(NewsProvider):
+    """NewsAPI.org (/v2/everything): поиск по названию темы за период."""
+
+    name = "newsapi"
+
+    def __init__(self, api_key: str, period: str = "12h", page_size: int = 50, client=None):
+        super().__init__(period)
+        if client is None:
+            if not api_key:
+                raise ValueError("Ключ NEWSAPI_KEY не найден в переменных окружения.")
+            client = NewsApiClient(api_key=api_key)
+        self.client = client
+        self.page_size = page_size
+
+    def iter_articles(self, topics: list[str], should_stop=lambda: False) -> Iterator[Article]:
+        since = datetime.fromtimestamp(self.since, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        for topic in topics:
+            if should_stop():
+                return
+            logger.debug("  -> [newsapi] Запрашиваю тему: %s", topic)
+            try:
+                response = self.client.get_everything(q=topic.lower(), from_param=since, language="en",
+                                                      sort_by="publishedAt", page_size=self.page_size)
+            except Exception as e:
+                logger.error(f"Ошибка NewsAPI по теме '{topic}': {e}")
+                continue
+            for item in response.get("articles", []):
+                if not item.get("description") or not item.get("url"):
+                    continue
+                yield Article(
+                    title=item.get("title") or "Без заголовка",
+                    text=item["description"],
+                    url=item["url"],
+                    publisher=(item.get("source") or {}).get("name") or "N/A",
+                    published=_parse_iso(item.get("publishedAt")),
+                    topic=topic,
+                )
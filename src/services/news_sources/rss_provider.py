@@ -0,0 +1,49 @@
+import logging
+from collections.abc import Iterator
+from src.models import Article
+from src.services.news_sources.base import NewsProvider
+
+logger = logging.getLogger(__name__)
+
+
+class RssProvider(NewsProvider):
+    """
+    Произвольные RSS/Atom-ленты. feeds — словарь {тема: [адреса лент]};
+    ленты под ключом "*" читаются для любого набора тем.
+    """
+
+    name = "rss"
+
+    def __init__(self, feeds: dict[str, list[str]], period: str = "12h", fetcher=None):
+        super().__init__(period)
+        self.feeds = feeds
+        self.fetcher = fetcher
+
+    def _feeds_for(self, topics: list[str]) -> list[tuple[str, str]]:
+        pairs = [(topic, url) for topic in topics for url in self.feeds.get(topic, [])]
+        pairs += [("*", url) for url in self.feeds.get("*", [])]
+        return pairs
+
+    def iter_articles(self, topics: list[str], should_stop=lambda: False) -> Iterator[Article]:
+        if self.fetcher is None:
+            from src.services.feed_fetcher import get_feed_fetcher
+            self.fetcher = get_feed_fetcher()
+        since = self.since
+        for topic, url in self._feeds_for(topics):
+            if should_stop():
+                return
+            logger.debug("  -> [rss] Читаю ленту: %s", url)
+            feed_title, entries = self.fetcher.fetch(url)
+            for entry in entries:
+                if entry["published"] is not None and entry["published"] < since:
+                    continue
+                if not entry["description"]:
+                    continue
+                yield Article(
+                    title=entry["title"] or "Без заголовка",
+                    text=entry["description"],
+                    url=entry["link"],
+                    publisher=entry["source"] or feed_title or "N/A",
+                    published=entry["published"],
+                    topic=None if topic == "*" else topic,
+                )
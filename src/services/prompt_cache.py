@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import threading
+import time
+from google.genai.types import CreateCachedContentConfig, UpdateCachedContentConfig
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PLACEHOLDER = "[Вставь полный дайджест новостей]"
+
+
+def split_prompt_template(prompt_template: str) -> tuple[str, str, str]:
+    """
+    Делит шаблон промпта на статическую инструкцию и обрамление дайджеста.
+
+    Возвращает (static_instruction, lead, tail): статическая часть — все строки
+    до строки с плейсхолдером; lead и tail — текст этой строки до и после плейсхолдера.
+    Запрос к модели собирается как lead + digest + tail.
+    """
+    head, found, tail = prompt_template.partition(DIGEST_PLACEHOLDER)
+    if not found:
+        return prompt_template.strip(), "", ""
+    static_instruction, _, lead = head.rpartition("\n")
+    return static_instruction.strip(), lead, tail
+
+
+class PromptCache:
+    """
+    Кэш статических инструкций промптов в Gemini (cached content).
+
+    Для каждой пары (модель, инструкция) объект кэша создается один раз с заданным TTL
+    и продлевается, когда до истечения остается меньше refresh_margin секунд.
+    Если создать кэш не удалось (например, инструкция короче минимального размера
+    для явного кэширования), возвращается None, и повторная попытка делается не раньше,
+    чем через TTL — до тех пор вызывающий код передает инструкцию как system_instruction.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, refresh_margin: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self._entries: dict[tuple[str, str, bool], dict] = {}
+        self._lock = threading.Lock()
+        self.tokens_saved = 0
+
+    def get_cache_name(self, client, model: str, static_instruction: str, tools=None) -> str | None:
+        # Кэш хранит инструкцию вместе с инструментами, поэтому запросы с поиском и без него кэшируются раздельно
+        key = (model, hashlib.sha256(static_instruction.encode("utf-8")).hexdigest(), bool(tools))
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry and entry["name"] is None and now < entry["expires_at"]:
+                return None
+            if entry and entry["name"] and now < entry["expires_at"] - self.refresh_margin:
+                return entry["name"]
+            if entry and entry["name"]:
+                if self._refresh(client, entry, now):
+                    return entry["name"]
+            self._entries[key] = entry = self._create(client, model, static_instruction, tools, key[1], now)
+            return entry["name"]
+
+    def _create(self, client, model: str, static_instruction: str, tools, digest: str, now: float) -> dict:
+        try:
+            cache = client.caches.create(
+                model=model,
+                config=CreateCachedContentConfig(
+                    display_name=f"prompt-{digest[:12]}",
+                    system_instruction=static_instruction,
+                    tools=tools,
+                    ttl=f"{self.ttl_seconds}s",
+                )
+            )
+            logger.info(f"Создан кэш статической инструкции промпта: {cache.name} (TTL {self.ttl_seconds} с).")
+            return {"name": cache.name, "expires_at": now + self.ttl_seconds}
+        except Exception as e:
+            logger.warning(f"Не удалось создать кэш промпта, инструкция будет передаваться как "
+                           f"system_instruction: {e}")
+            return {"name": None, "expires_at": now + self.ttl_seconds}
+
+    def _refresh(self, client, entry: dict, now: float) -> bool:
+        try:
+            client.caches.update(name=entry["name"],
+                                 config=UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"))
+            entry["expires_at"] = now + self.ttl_seconds
+            logger.info(f"Кэш промпта {entry['name']} продлен на {self.ttl_seconds} с.")
+            return True
+        except Exception as e:
+            logger.warning(f"Не удалось продлить кэш промпта {entry['name']}, создаю заново: {e}")
+            return False
+
+    def record_usage(self, cached_tokens: int):
+        with self._lock:
+            self.tokens_saved += cached_tokens
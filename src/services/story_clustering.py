@@ -0,0 +1,158 @@
+import logging
+import re
+import time
+from collections import Counter
+import numpy as np
+from src.models import Article, Story
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9]{2,}")
+_STOPWORDS = frozenset("""
+the and for with that this from are was were has have had its into over after about than more says said
+will would could their they them what when where which while who why how not but all also been new
+news report reports year years week today yesterday per its our your you his her she him out up down
+""".split())
+
+
+def _tokens(article: Article) -> list[str]:
+    title = [token for token in _TOKEN_RE.findall(article.title.lower()) if token not in _STOPWORDS]
+    text = [token for token in _TOKEN_RE.findall(article.text[:1000].lower()) if token not in _STOPWORDS]
+    # Заголовок учитывается дважды: он точнее описания указывает на событие
+    return title + title + text
+
+
+class TfidfMatrix:
+    """Разреженная матрица TF-IDF в формате CSR (indptr, indices, data) с нормированными строками."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_features: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.indptr) - 1
+
+    def dense_rows(self, start: int, stop: int) -> np.ndarray:
+        """Плотный блок строк [start, stop) — для умножения батча на матрицу лидеров."""
+        block = np.zeros((stop - start, self.n_features), dtype=np.float32)
+        lo, hi = self.indptr[start], self.indptr[stop]
+        rows = np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1]))
+        block[rows, self.indices[lo:hi]] = self.data[lo:hi]
+        return block
+
+
+def build_tfidf(articles: list[Article], max_features: int = 2000) -> TfidfMatrix:
+    """
+    Строит TF-IDF по заголовкам и началу описаний.
+    Словарь — max_features слов с наибольшей документной частотой среди встречающихся
+    хотя бы в двух статьях (слова из одной статьи не влияют на сходство).
+    """
+    docs = [Counter(_tokens(article)) for article in articles]
+    doc_freq = Counter()
+    for doc in docs:
+        doc_freq.update(doc.keys())
+    terms = [term for term, count in doc_freq.most_common() if count > 1][:max_features]
+    vocab = {term: index for index, term in enumerate(terms)}
+
+    indptr = np.zeros(len(docs) + 1, dtype=np.int64)
+    indices, counts = [], []
+    for row, doc in enumerate(docs):
+        for term, count in doc.items():
+            column = vocab.get(term)
+            if column is not None:
+                indices.append(column)
+                counts.append(count)
+        indptr[row + 1] = len(indices)
+
+    indices = np.asarray(indices, dtype=np.int32)
+    counts = np.asarray(counts, dtype=np.float32)
+    df = np.asarray([doc_freq[term] for term in terms], dtype=np.float32)
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+    data = (1 + np.log(counts)) * idf[indices]
+    rows = np.repeat(np.arange(len(docs)), np.diff(indptr))
+    norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=len(docs))).astype(np.float32)
+    norms[norms == 0] = 1
+    data /= norms[rows]
+    return TfidfMatrix(indptr, indices, data.astype(np.float32), len(terms))
+
+
+def _leader_clusters(matrix: TfidfMatrix, threshold: float, batch_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Кластеризация лидерами: статья присоединяется к самому похожему лидеру, если косинусное
+    сходство не ниже threshold, иначе сама становится лидером нового кластера.
+
+    Сходство батча со всеми лидерами считается одним матричным умножением; внутри батча
+    статьи сравниваются с лидерами, появившимися в этом же батче, по матрице batch @ batch.T.
+    Возвращает (номер кластера, сходство с лидером) для каждой статьи.
+    """
+    n_rows = matrix.n_rows
+    assignment = np.empty(n_rows, dtype=np.int32)
+    similarity = np.ones(n_rows, dtype=np.float32)
+    leaders = np.zeros((min(n_rows, 64), matrix.n_features), dtype=np.float32)
+    n_leaders = 0
+
+    for start in range(0, n_rows, batch_size):
+        stop = min(start + batch_size, n_rows)
+        batch = matrix.dense_rows(start, stop)
+        if n_leaders:
+            sims = batch @ leaders[:n_leaders].T
+            best = sims.argmax(axis=1)
+            best_sim = sims[np.arange(len(batch)), best]
+        else:
+            best = np.zeros(len(batch), dtype=np.int64)
+            best_sim = np.full(len(batch), -1.0, dtype=np.float32)
+        intra = batch @ batch.T
+
+        new_positions: list[int] = []
+        for k in range(len(batch)):
+            cluster, score = int(best[k]), float(best_sim[k])
+            if new_positions:
+                candidates = intra[k, new_positions]
+                local = int(candidates.argmax())
+                if candidates[local] > score:
+                    cluster, score = n_leaders + local, float(candidates[local])
+            if score >= threshold:
+                assignment[start + k] = cluster
+                similarity[start + k] = score
+            else:
+                assignment[start + k] = n_leaders + len(new_positions)
+                new_positions.append(k)
+
+        if new_positions:
+            needed = n_leaders + len(new_positions)
+            if needed > len(leaders):
+                grown = np.zeros((max(needed, 2 * len(leaders)), matrix.n_features), dtype=np.float32)
+                grown[:n_leaders] = leaders[:n_leaders]
+                leaders = grown
+            leaders[n_leaders:needed] = batch[new_positions]
+            n_leaders = needed
+
+    return assignment, similarity
+
+
+def cluster_articles(articles: list[Article], threshold: float = 0.35, max_features: int = 2000,
+                     batch_size: int = 256) -> list[Story]:
+    """
+    Группирует статьи в сюжеты. Сюжеты упорядочены по числу источников, затем по порядку
+    появления; статьи внутри сюжета — по сходству с лидером.
+    """
+    if not articles:
+        return []
+    started = time.perf_counter()
+    matrix = build_tfidf(articles, max_features)
+    assignment, similarity = _leader_clusters(matrix, threshold, batch_size)
+
+    members: dict[int, list[int]] = {}
+    for index, cluster in enumerate(assignment.tolist()):
+        members.setdefault(cluster, []).append(index)
+    stories = [
+        Story([articles[index] for index in sorted(indices, key=lambda i: -similarity[i])])
+        for indices in members.values()
+    ]
+    stories.sort(key=lambda story: len(story.publishers), reverse=True)
+    logger.info(f"Кластеризация: {len(articles)} статей -> {len(stories)} сюжетов "
+                f"(словарь {matrix.n_features} слов) за {time.perf_counter() - started:.2f} с.")
+    return stories
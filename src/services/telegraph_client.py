@@ -9,16 +9,19 @@ logger = logging.getLogger(__name__)
 
 
 class TelegraphClient:
-    def __init__(self, author_name="Author", author_url=SUPERGROUP_LINK):
+    def __init__(self, author_name="Author", author_url=SUPERGROUP_LINK, client=None):
         """
         Инициализирует клиент Telegraph.
         author_name: Имя автора, которое будет отображаться на странице.
         author_url: Ссылка, которая будет привязана к имени автора.
+        client: готовый клиент с интерфейсом Telegraph (например, локальная заглушка).
         """
-        if not TELEGRAPH_ACCESS_TOKEN:
-            raise ValueError("Токен TELEGRAPH_ACCESS_TOKEN не найден в переменных окружения.")
+        if client is None:
+            if not TELEGRAPH_ACCESS_TOKEN:
+                raise ValueError("Токен TELEGRAPH_ACCESS_TOKEN не найден в переменных окружения.")
+            client = Telegraph(access_token=TELEGRAPH_ACCESS_TOKEN)
 
-        self.client = Telegraph(access_token=TELEGRAPH_ACCESS_TOKEN)
+        self.client = client
         self.author_name = author_name
         self.author_url = author_url
         logger.info("Клиент Telegraph успешно инициализирован.")
@@ -48,6 +51,32 @@ class TelegraphClient:
             logger.error(f"Ошибка при создании страницы в Telegraph: {e}", exc_info=True)
             return None
 
+    def edit_page(self, page_url: str, title: str, html_content: str) -> bool:
+        """
+        Заменяет содержимое существующей страницы (ссылка на нее не меняется).
+
+        Args:
+            page_url: URL страницы, возвращенный create_page.
+            title: Заголовок страницы.
+            html_content: Новое содержимое страницы в формате HTML.
+
+        Returns:
+            True, если страница обновлена.
+        """
+        path = page_url.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            self.client.edit_page(
+                path=path,
+                title=title,
+                html_content=html_content,
+                author_name=self.author_name,
+                author_url=self.author_url
+            )
+            logger.info(f"Страница Telegraph обновлена: {page_url}")
+            return True
+        except TelegraphException as e:
+            logger.error(f"Ошибка при обновлении страницы в Telegraph: {e}", exc_info=True)
+            return False
 
 # Пример использования (можно удалить или закомментировать)
 if __name__ == '__main__':
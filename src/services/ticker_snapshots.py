@@ -0,0 +1,148 @@
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from src.config import CACHE_DIR, TICKER_TTL_STOCK, TICKER_TTL_CRYPTO, TICKER_TTL_FX
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    ticker TEXT PRIMARY KEY,
+    price TEXT NOT NULL,
+    ma50 TEXT,
+    ma200 TEXT,
+    rsi TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+_CRYPTO = frozenset("""
+BTC ETH SOL XRP BNB ADA DOGE TON TRX AVAX DOT LINK LTC BCH MATIC POL SHIB USDT USDC XLM ATOM NEAR APT
+ARB OP SUI UNI ETC FIL HBAR ICP PEPE AAVE XMR
+""".split())
+_CURRENCIES = frozenset("USD EUR JPY GBP CHF CAD AUD NZD CNY CNH SEK NOK HKD SGD MXN ZAR TRY RUB DXY".split())
+
+_FIELDS = ("price", "ma50", "ma200", "rsi")
+_TICKER_RE = re.compile(r"[A-Z]{2,6}(?:/[A-Z]{2,3})?")
+_BLOCK_RE = re.compile(r"Тикер:\s*(.+?)\s*</h4>(.*?)(?=<h4>|$)", re.DOTALL)
+_VALUES_RE = re.compile(r"Цена:\s*(.+?),\s*MA50:\s*(.+?),\s*MA200:\s*(.+?),\s*RSI:\s*([^<\n]+)")
+
+
+def normalize_ticker(ticker: str) -> str:
+    return ticker.strip().upper()
+
+
+def asset_class(ticker: str) -> str:
+    """'crypto', 'fx' или 'stock' — по нему выбирается срок годности данных."""
+    ticker = normalize_ticker(ticker)
+    base, _, quote = ticker.partition("/")
+    if base.removesuffix("-USD") in _CRYPTO:
+        return "crypto"
+    if (quote and base in _CURRENCIES) or ticker == "DXY":
+        return "fx"
+    # Пары без разделителя: EURUSD, USDJPY
+    if len(ticker) == 6 and ticker[:3] in _CURRENCIES and ticker[3:] in _CURRENCIES:
+        return "fx"
+    return "stock"
+
+
+def _has_value(value) -> bool:
+    # Шаблонные "[значение]", "N/A" и "нет данных" не кэшируются
+    return value is not None and any(char.isdigit() for char in str(value))
+
+
+def _snapshot(ticker: str, values) -> dict | None:
+    snapshot = {"ticker": normalize_ticker(ticker)}
+    snapshot.update((field, str(value).strip() if _has_value(value) else None) for field, value in zip(_FIELDS, values))
+    return snapshot if snapshot["price"] else None
+
+
+def parse_stage2_snapshots(stage2_html: str) -> list[dict]:
+    """Технические данные из HTML 2-го этапа: блоки "Тикер: X" со строкой "Цена: .., MA50: .., MA200: .., RSI: ..."."""
+    snapshots = []
+    for header, body in _BLOCK_RE.findall(stage2_html or ""):
+        ticker = _TICKER_RE.search(header)
+        values = _VALUES_RE.search(body)
+        if ticker and values:
+            snapshot = _snapshot(ticker.group(0), (value.strip() for value in values.groups()))
+            if snapshot:
+                snapshots.append(snapshot)
+    return snapshots
+
+
+def snapshots_from_report(report) -> list[dict]:
+    """Технические данные из проверенного Stage2Report (режим JSON)."""
+    snapshots = (_snapshot(item.ticker, (item.price, item.ma50, item.ma200, item.rsi))
+                 for item in report.recommendations)
+    return [snapshot for snapshot in snapshots if snapshot]
+
+
+def format_snapshot(snapshot: dict) -> str:
+    fetched_at = datetime.fromtimestamp(snapshot["fetched_at"]).strftime("%d.%m.%Y %H:%M")
+    values = ", ".join(f"{label}: {snapshot[field] or 'нет данных'}"
+                       for label, field in zip(("Цена", "MA50", "MA200", "RSI"), _FIELDS))
+    return f"{snapshot['ticker']}: {values} (данные на {fetched_at})"
+
+
+class TickerSnapshotCache:
+    """
+    Последние технические данные (цена, MA50, MA200, RSI) по тикерам, общие для всех
+    типов анализа и процессов. Срок годности зависит от класса актива (ttls: stock/crypto/fx).
+    """
+
+    def __init__(self, path: Path, ttls: dict[str, float]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttls = ttls
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_fresh(self, tickers: list[str]) -> dict[str, dict]:
+        """Неустаревшие данные по тикерам: {тикер: snapshot}."""
+        tickers = sorted({normalize_ticker(ticker) for ticker in tickers})
+        if not tickers:
+            return {}
+        placeholders = ",".join("?" * len(tickers))
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM snapshots WHERE ticker IN ({placeholders})", tickers).fetchall()
+        now = time.time()
+        return {row["ticker"]: dict(row) for row in rows
+                if now - row["fetched_at"] <= self.ttls.get(asset_class(row["ticker"]), 0)}
+
+    def put(self, snapshots: list[dict]):
+        if not snapshots:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO snapshots (ticker, price, ma50, ma200, rsi, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(s["ticker"], s["price"], s["ma50"], s["ma200"], s["rsi"], now) for s in snapshots]
+            )
+
+
+_default_cache: TickerSnapshotCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_ticker_snapshot_cache() -> TickerSnapshotCache:
+    """Кэш по пути CACHE_DIR/ticker_snapshots.sqlite3, общий для процесса (и для воркеров через файл)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TickerSnapshotCache(
+                CACHE_DIR / "ticker_snapshots.sqlite3",
+                ttls={"stock": TICKER_TTL_STOCK, "crypto": TICKER_TTL_CRYPTO, "fx": TICKER_TTL_FX},
+            )
+        return _default_cache
@@ -0,0 +1,116 @@
+"""
+Профилирование запуска приложения: время импорта модулей (аналог `python -X importtime`)
+и время до получения ботом первого обновления.
+
+Включается переменной окружения STARTUP_PROFILE=1 или флагом `--profile-startup` у run.py.
+Модуль не импортирует ничего тяжелого, чтобы его можно было подключить первым.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    "enabled": False,
+    "started_at": time.perf_counter(),
+    "marks": [],
+    "imports": [],  # (имя модуля, собственное время, суммарное время, глубина)
+    "reported": False,
+}
+_local = threading.local()
+
+
+def requested(argv: list[str]) -> bool:
+    return "--profile-startup" in argv or os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+class _TimingLoader:
+    """Обертка загрузчика: замеряет exec_module и восстанавливает исходный загрузчик у модуля."""
+
+    def __init__(self, loader, fullname: str):
+        self._loader = loader
+        self._fullname = fullname
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(0.0)  # время дочерних импортов
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            _state["imports"].append((self._fullname, cumulative - children, cumulative, len(stack)))
+            module.__loader__ = self._loader
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self._loader
+
+
+class _TimingFinder:
+    """Искатель модулей в начале sys.meta_path: подставляет _TimingLoader в найденные спецификации."""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimingLoader(spec.loader, fullname)
+            return spec
+        return None
+
+
+def enable():
+    """Начинает замер импортов. Вызывать как можно раньше, до импорта модулей приложения."""
+    if _state["enabled"]:
+        return
+    _state["enabled"] = True
+    sys.meta_path.insert(0, _TimingFinder())
+
+
+def is_enabled() -> bool:
+    return _state["enabled"]
+
+
+def mark(name: str):
+    """Отмечает этап запуска (время от старта процесса)."""
+    if _state["enabled"]:
+        _state["marks"].append((name, time.perf_counter() - _state["started_at"]))
+
+
+def on_first_update(updates):
+    """Слушатель обновлений бота: при первом обновлении фиксирует время и печатает отчет."""
+    if not _state["enabled"] or _state["reported"]:
+        return
+    _state["reported"] = True
+    mark("first_update")
+    logger.info(report())
+
+
+def report(top: int = 25) -> str:
+    """Формирует текстовый отчет: этапы запуска и самые долгие импорты."""
+    lines = ["Профиль запуска:"]
+    for name, at in _state["marks"]:
+        lines.append(f"  {name:<24} {at * 1000:10.1f} мс")
+    total_import = sum(cumulative for _, _, cumulative, depth in _state["imports"] if depth == 0)
+    lines.append(f"Импорт модулей: {len(_state['imports'])} шт., {total_import * 1000:.1f} мс (верхний уровень).")
+    lines.append(f"  {'собств., мкс':>12} | {'суммарно, мкс':>13} | модуль")
+    slowest = sorted(_state["imports"], key=lambda item: item[2], reverse=True)[:top]
+    for fullname, self_time, cumulative, depth in slowest:
+        lines.append(f"  {self_time * 1e6:12.0f} | {cumulative * 1e6:13.0f} | {'  ' * depth}{fullname}")
+    return "\n".join(lines)